@@ -11,12 +11,16 @@ Usage: docker run <imagename> COMMAND
 Commands
 
 dev       : Run Django development server
+asgi      : Run the ASGI server (uvicorn, views in a bounded thread pool)
+serve     : Run the production server (gunicorn, one preloaded ASGI worker per core, see gunicorn.conf.py)
+migrate   : Apply the migrations, run it once per release before serve
 python    : Run Python command
 bash      : Run bash shell
 test      : Run tests
 help      : Show this message
 manage    : Run manage command for project
 init_base : Load init.json from fixtures dir for project
+import    : Import tasks from a JSON Lines or CSV file (manage.py import_tasks)
 """
 }
 
@@ -30,14 +34,40 @@ run_dev_server() {
     python manage.py runserver 0.0.0.0:8000
 }
 
+run_server() {
+    # Events of one worker reach the streams of the others through sockets in this directory
+    export EVENT_SOCKET_DIR=${EVENT_SOCKET_DIR:-/tmp/task_tracker-events}
+    mkdir -p "$EVENT_SOCKET_DIR"
+    # /metrics of any worker reports the metrics of all of them
+    export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/task_tracker-metrics}
+    exec gunicorn task_tracker.asgi:application "$@"
+}
+
+run_asgi_server() {
+    setup_db
+    uvicorn task_tracker.asgi:application --host 0.0.0.0 --port 8000 "$@"
+}
+
 # Run
 case "$1" in
     dev)
         run_dev_server
     ;;
+    asgi)
+        run_asgi_server "${@:2}"
+    ;;
+    serve)
+        run_server "${@:2}"
+    ;;
+    migrate)
+        python manage.py migrate --noinput
+    ;;
     init_base)
         python manage.py loaddata fixtures/init.json
     ;;
+    import)
+        python manage.py import_tasks "${@:2}"
+    ;;
     python)
         python "${@:2}"
     ;;
@@ -0,0 +1,53 @@
+# Gunicorn settings of the `serve` command of docker-entrypoint.sh, all of
+# them can be overridden by environment variables.
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get('SERVE_BIND', '0.0.0.0:8000')
+# One worker per core, each serving many requests with its event loop and thread pool
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Import Django and warm it up once in the master, the forked workers share
+# its memory copy-on-write and start serving right away
+preload_app = True
+
+# Recycle workers after a number of requests, jittered so they do not all
+# restart together; a recycled or HUP'ed worker finishes its requests first
+max_requests = int(os.environ.get('SERVE_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('SERVE_MAX_REQUESTS_JITTER', 1000))
+graceful_timeout = int(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30))
+
+# Created once the master is warmed up and about to fork, removed on exit
+ready_file = os.environ.get('SERVE_READY_FILE', '/tmp/task_tracker.ready')
+
+
+# Every worker writes its metrics there, /metrics merges them; emptied on start
+metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def on_starting(server):
+    if os.path.exists(ready_file):
+        os.unlink(ready_file)
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+
+def when_ready(server):
+    from task_tracker.warmup import warm_up
+    warm_up()
+    with open(ready_file, 'w') as f:
+        f.write(str(os.getpid()))
+
+
+def child_exit(server, worker):
+    if metrics_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if os.path.exists(ready_file):
+        os.unlink(ready_file)
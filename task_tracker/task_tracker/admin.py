@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django import forms
-from task_tracker.models import Project, Status, Description, Comment, Task
+from task_tracker.models import Project, Status, Description, Comment, Task, SavedView
 
 
 @admin.register(Project)
@@ -43,3 +43,13 @@ class TaskAdmin(admin.ModelAdmin):
         'created',
         'updated',
     )
+
+
+@admin.register(SavedView)
+class SavedViewAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'owner',
+        'params',
+        'updated',
+    )
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class TaskTrackerConfig(AppConfig):
+    name = 'task_tracker'
+
+    def ready(self):
+        import task_tracker.receivers  # noqa: F401
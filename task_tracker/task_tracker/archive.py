@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+from task_tracker import changes, search, stats
+from task_tracker.lookups import status_cache
+from task_tracker.models import ArchivedComment, ArchivedDescription, ArchivedTask, Comment, Description, \
+    SavedViewTask, Task
+
+# Live model and its archive model, copied in this order
+ARCHIVE_MODELS = (
+    (Task, ArchivedTask),
+    (Description, ArchivedDescription),
+    (Comment, ArchivedComment),
+)
+
+
+def get_policy(statuses=None, days=None, now=None):
+    """
+    (status ids, cutoff) of the tasks to archive: in one of `statuses`
+    (ARCHIVE_STATUSES by default) and not updated for `days` days
+    (ARCHIVE_AFTER_DAYS). Unknown status names are ignored.
+    """
+    statuses = statuses if statuses is not None else settings.ARCHIVE_STATUSES
+    days = days if days is not None else settings.ARCHIVE_AFTER_DAYS
+    status_ids = sorted(status.pk for status in status_cache.get_many(statuses).values())
+    return status_ids, (now or timezone.now()) - timedelta(days=days)
+
+
+def get_archivable_ids(status_ids, cutoff, limit, using=None):
+    """
+    Ids of up to `limit` tasks to archive, least recently updated first.
+    """
+    return list(
+        Task.objects.using(using).filter(status_id__in=status_ids, updated__lt=cutoff).order_by(
+            'updated', 'id'
+        ).values_list('id', flat=True)[:limit]
+    )
+
+
+def copy_rows(cursor, connection, source, target, where, params, **values):
+    """
+    INSERT ... SELECT the rows of `source` matching `where` into `target`,
+    which has the same columns and those of `values`.
+    """
+    quote = connection.ops.quote_name
+    columns = [quote(field.column) for field in source._meta.concrete_fields]
+    cursor.execute(
+        'INSERT INTO {} ({}) SELECT {} FROM {} WHERE {}'.format(
+            quote(target._meta.db_table),
+            ', '.join(columns + [quote(column) for column in values]),
+            ', '.join(columns + ['%s'] * len(values)),
+            quote(source._meta.db_table),
+            where
+        ),
+        list(values.values()) + list(params)
+    )
+
+
+def in_clause(column, values):
+    return '{} IN ({})'.format(column, ', '.join(['%s'] * len(values)))
+
+
+def archive_tasks(task_ids, status_ids=None, updated_before=None, using=None):
+    """
+    Move the tasks `task_ids`, those still in one of `status_ids` and last
+    updated before `updated_before` if given, with their descriptions and
+    comments to the archive tables, and out of the search index, saved
+    views and task counters. The change log reports them as deleted, they
+    left the task list. Must be called inside a transaction.
+
+    Returns the ids of the archived tasks.
+    """
+    using = using or router.db_for_write(Task)
+    connection = connections[using]
+    assert connection.in_atomic_block, 'archive_tasks() must be called inside a transaction'
+    task_ids = list(task_ids)
+    if not task_ids:
+        return []
+
+    where = [in_clause('id', task_ids)]
+    params = list(task_ids)
+    if status_ids is not None:
+        where.append(in_clause('status_id', status_ids))
+        params += status_ids
+    if updated_before is not None:
+        where.append('updated < %s')
+        params.append(connection.ops.adapt_datetimefield_value(updated_before))
+
+    archived = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        # Checked by the first statement, a write: on SQLite the transaction
+        # holds the write lock from there, a task cannot change meanwhile
+        copy_rows(cursor, connection, Task, ArchivedTask, ' AND '.join(where), params, archived=archived)
+        archived_tasks = list(ArchivedTask.objects.using(using).filter(pk__in=task_ids).only(
+            'id', 'project', 'status', 'assignee'
+        ))
+        task_ids = [task.pk for task in archived_tasks]
+        if not task_ids:
+            return []
+
+        for source, target in ARCHIVE_MODELS[1:]:
+            copy_rows(cursor, connection, source, target, in_clause('task_id', task_ids), task_ids)
+        documents = [Task(pk=pk) for pk in task_ids]
+        documents += [
+            model(pk=pk) for model, archive_model in ARCHIVE_MODELS[1:]
+            for pk in archive_model.objects.using(using).filter(task_id__in=task_ids).values_list('id', flat=True)
+        ]
+
+        for model in (SavedViewTask, Comment, Description):
+            cursor.execute(
+                'DELETE FROM {} WHERE {}'.format(
+                    connection.ops.quote_name(model._meta.db_table), in_clause('task_id', task_ids)
+                ),
+                task_ids
+            )
+        cursor.execute(
+            'DELETE FROM {} WHERE {}'.format(connection.ops.quote_name(Task._meta.db_table), in_clause('id', task_ids)),
+            task_ids
+        )
+
+    search.unindex_objects(documents, using=using)
+    changes.record_changes(task_ids, deleted=True, using=using)
+    stats.tasks_removed(archived_tasks, using=using)
+    return task_ids
@@ -0,0 +1,18 @@
+"""
+ASGI config for task_tracker project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+run it with an ASGI server, e.g. ``uvicorn task_tracker.asgi:application``.
+The views run in a bounded thread pool, see task_tracker.asgi_handler.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task_tracker.settings')
+django.setup(set_prefix=False)
+
+from task_tracker.asgi_handler import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -0,0 +1,246 @@
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+# request.META key of the event loop serving the request, set for views
+# that can hand their response over to the loop (see `async_streaming_content`)
+EVENT_LOOP_KEY = 'task_tracker.event_loop'
+
+# Chunks of a streamed response read ahead of the client
+STREAM_BUFFER_SIZE = 4
+
+
+def build_environ(scope, body):
+    """
+    The WSGI environ of an ASGI HTTP scope, `body` being a file with the
+    request body.
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI wants the raw path bytes as latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = '{},{}'.format(environ[name], value) if name in environ else value
+
+    if 'CONTENT_LENGTH' not in environ:
+        # A chunked body, Django reads CONTENT_LENGTH bytes
+        body.seek(0, 2)
+        environ['CONTENT_LENGTH'] = str(body.tell())
+        body.seek(0)
+    return environ
+
+
+class ASGIHandler(object):
+    """
+    ASGI application running the Django views in a bounded thread pool.
+
+    Django 2.1 views are synchronous, so every view, read or write, runs as
+    it does under WSGI, in one of ASGI_THREADS threads. Everything else is
+    done by the event loop: reading the request body, waiting for a free
+    thread and sending the response. A request waiting for the pool or a
+    slow client only costs a coroutine, so a node keeps thousands of
+    requests in flight with a fixed number of threads and database
+    connections.
+
+    A streamed response (exports, NDJSON/CSV lists) is read in one thread,
+    since its database cursor cannot change threads, of a separate pool of
+    ASGI_STREAM_THREADS: long transfers never take the threads of the
+    views. The thread reads ahead of the loop sending the chunks and only
+    waits for a client slower than the database. A response with an
+    `async_streaming_content` async iterator (the event stream) is sent by
+    the loop alone and holds no thread at all.
+    """
+
+    def __init__(self, max_threads=None, max_stream_threads=None):
+        self.wsgi_handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_threads or settings.ASGI_THREADS, thread_name_prefix='asgi'
+        )
+        self.stream_executor = ThreadPoolExecutor(
+            max_workers=max_stream_threads or settings.ASGI_STREAM_THREADS, thread_name_prefix='asgi-stream'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+        else:
+            raise ValueError('Unsupported ASGI scope type {}'.format(scope['type']))
+
+    async def handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Waited for in another thread: the loop keeps sending the
+                # responses in flight, the threads of streams wait for it
+                loop = asyncio.get_event_loop()
+                await asyncio.gather(*(
+                    loop.run_in_executor(None, partial(executor.shutdown, wait=True))
+                    for executor in (self.executor, self.stream_executor)
+                ))
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """
+        The request body in a file, spooled to disk when it is large, or None
+        if the client disconnected.
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    async def handle_http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+
+        loop = asyncio.get_event_loop()
+        environ = build_environ(scope, body)
+        environ[EVENT_LOOP_KEY] = loop
+        try:
+            status, headers, response = await loop.run_in_executor(self.executor, self.get_response, environ)
+            start = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+
+            if getattr(response, 'async_streaming_content', None) is not None:
+                await send(start)
+                await self.send_async_stream(response, receive, send)
+                await loop.run_in_executor(self.executor, response.close)
+            elif getattr(response, 'streaming', False):
+                await send(start)
+                await self.send_stream(response, send, loop)
+            else:
+                content = await loop.run_in_executor(self.executor, self.read_content, response)
+                await send(start)
+                await send({'type': 'http.response.body', 'body': content})
+        finally:
+            body.close()
+
+    def get_response(self, environ):
+        result = []
+
+        def start_response(status, headers, exc_info=None):
+            result[:] = [status, headers]
+
+        response = self.wsgi_handler(environ, start_response)
+        return result[0], result[1], response
+
+    @staticmethod
+    def read_content(response):
+        # Closing the response ends the request: request_finished closes the
+        # database connection of this thread when it is due
+        try:
+            return b''.join(response)
+        finally:
+            response.close()
+
+    async def send_stream(self, response, send, loop):
+        """
+        Send the chunks of a streamed response as a thread of the stream pool
+        reads them, up to STREAM_BUFFER_SIZE ahead.
+        """
+        chunks = asyncio.Queue(STREAM_BUFFER_SIZE, loop=loop)
+        cancelled = threading.Event()
+        reading = loop.run_in_executor(self.stream_executor, self.read_stream, response, chunks, cancelled, loop)
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        except BaseException:
+            # Unblock the reader, it stops at its next chunk
+            cancelled.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+            raise
+        await reading
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    def read_stream(response, chunks, cancelled, loop):
+        # None ends the chunks, also when reading them failed
+        try:
+            for chunk in response:
+                if cancelled.is_set():
+                    return
+                if chunk:
+                    asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+        finally:
+            response.close()
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(chunks.put(None), loop).result()
+
+    @staticmethod
+    async def send_async_stream(response, receive, send):
+        """
+        Send the chunks of `async_streaming_content` until it ends or the
+        client disconnects.
+        """
+        content = response.async_streaming_content
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while True:
+                chunk = asyncio.ensure_future(content.__anext__())
+                done, _ = await asyncio.wait({chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if chunk not in done:
+                    chunk.cancel()
+                    await asyncio.wait({chunk})
+                    return
+                try:
+                    data = chunk.result()
+                except StopAsyncIteration:
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return
+                await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+        finally:
+            disconnected.cancel()
+            await content.aclose()
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
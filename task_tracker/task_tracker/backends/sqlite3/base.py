@@ -0,0 +1,20 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend starting transactions with BEGIN IMMEDIATE.
+
+    A plain (deferred) BEGIN only takes the write lock at the first write.
+    In WAL mode a transaction that has read and then finds the database
+    written by another connection since cannot upgrade: SQLite fails the
+    write with "database is locked" at once, busy_timeout does not help.
+    Every read-then-write transaction of the app (task saves and their
+    counters, bulk updates, bulk_create_with_ids, archival) hits that under
+    concurrent writers. BEGIN IMMEDIATE takes the write lock up front,
+    waiting up to busy_timeout for it, so the transaction cannot fail later.
+    Reads outside transaction.atomic() are unaffected.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,443 @@
+import itertools
+import json
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from task_tracker.bulk import bulk_create_with_ids
+from task_tracker.importer import explicit_timestamps
+from task_tracker.models import Comment, Description, Project, Status, Task
+from task_tracker.warmup import warm_up
+
+STATUS_NAMES = ('NEW', 'IN_PROGRESS', 'REVIEW', 'DONE', 'CLOSED')
+# Text vocabulary, drawn with a skew so searches have common and rare terms
+WORDS = (
+    'error', 'build', 'deploy', 'release', 'login', 'page', 'report', 'crash', 'timeout', 'database', 'index',
+    'query', 'cache', 'server', 'client', 'mobile', 'payment', 'invoice', 'email', 'export', 'import', 'search',
+    'filter', 'upload', 'image', 'thumbnail', 'permission', 'session', 'token', 'migration', 'schema', 'backup',
+    'restore', 'monitoring', 'alert', 'latency', 'memory', 'leak', 'retry', 'queue', 'worker', 'scheduler',
+    'notification', 'locale', 'translation', 'font', 'layout', 'button', 'dialog', 'table', 'chart', 'dashboard',
+    'metrics', 'logging', 'audit', 'webhook', 'integration', 'sandbox', 'staging', 'production', 'regression',
+    'flaky', 'refactor', 'cleanup', 'upgrade', 'dependency', 'security', 'password', 'captcha', 'throttle',
+)
+
+
+def zipf_cum_weights(count, exponent):
+    """
+    Cumulative weights of `count` ranks, rank k drawn in proportion to 1 / k^exponent.
+    """
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class DatasetGenerator(object):
+    """
+    Generates a reproducible dataset with the skew of a real tracker: a few
+    projects, statuses and assignees hold most of the tasks, and a few hot
+    tasks get most of the comments. The same options and seed always give
+    the same rows, timestamps being relative to the time of the run.
+    """
+
+    def __init__(self, tasks, comments, projects=20, users=200, descriptions=1, skew=1.0, comment_skew=0.6,
+                 days=365, seed=0, password='bench', prefix='bench'):
+        self.tasks = tasks
+        self.comments = comments
+        self.projects = projects
+        self.users = users
+        self.descriptions = descriptions
+        self.skew = skew
+        self.comment_skew = comment_skew
+        self.days = days
+        self.password = password
+        self.prefix = prefix
+        self.random = random.Random(seed)
+        self.word_weights = zipf_cum_weights(len(WORDS), skew)
+        self.now = timezone.now()
+
+    def create_references(self):
+        """
+        Create the projects, statuses and users missing from the database,
+        all users with `password`. Returns them in skew order, most used first.
+        """
+        project_names = ['{}-{:03d}'.format(self.prefix, number) for number in range(self.projects)]
+        usernames = ['{}{:04d}'.format(self.prefix, number) for number in range(self.users)]
+        for name in STATUS_NAMES:
+            Status.objects.get_or_create(name=name)
+
+        existing = set(Project.objects.filter(name__in=project_names).values_list('name', flat=True))
+        Project.objects.bulk_create(Project(name=name) for name in project_names if name not in existing)
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        password = make_password(self.password)
+        User.objects.bulk_create(
+            User(username=name, password=password) for name in usernames if name not in existing
+        )
+
+        projects = Project.objects.in_bulk(project_names, field_name='name')
+        statuses = Status.objects.in_bulk(STATUS_NAMES, field_name='name')
+        users = User.objects.in_bulk(usernames, field_name='username')
+        return (
+            self.shuffled([projects[name] for name in project_names]),
+            self.shuffled([statuses[name] for name in STATUS_NAMES]),
+            self.shuffled([users[name] for name in usernames]),
+        )
+
+    def shuffled(self, objs):
+        self.random.shuffle(objs)
+        return objs
+
+    def text(self, min_words, max_words):
+        return ' '.join(self.random.choices(
+            WORDS, cum_weights=self.word_weights, k=self.random.randint(min_words, max_words)
+        ))
+
+    def timestamp_after(self, start):
+        return start + (self.now - start) * self.random.random()
+
+    def comment_counts(self):
+        """
+        Number of comments of each task, by task number, hot tasks spread
+        over the whole id range.
+        """
+        ranks = list(range(self.tasks))
+        self.random.shuffle(ranks)
+        cum_weights = zipf_cum_weights(self.tasks, self.comment_skew)
+        counts = Counter(self.random.choices(range(self.tasks), cum_weights=cum_weights, k=self.comments))
+        return [counts[rank] for rank in ranks]
+
+    def generate(self, batch_size=2000, progress=None):
+        """
+        Insert the dataset in transactions of `batch_size` tasks, with their
+        descriptions and comments, through the bulk write paths so the
+        search index, summaries and change log are maintained as in an import.
+
+        Returns the number of tasks, descriptions and comments created.
+        """
+        projects, statuses, users = self.create_references()
+        project_weights = zipf_cum_weights(len(projects), self.skew)
+        status_weights = zipf_cum_weights(len(statuses), self.skew)
+        user_weights = zipf_cum_weights(len(users), self.skew)
+        comment_counts = self.comment_counts() if self.tasks else []
+        oldest = self.now - timedelta(days=self.days)
+        totals = [0, 0, 0]
+
+        for start in range(0, self.tasks, batch_size):
+            tasks = []
+            for _ in range(start, min(start + batch_size, self.tasks)):
+                created = self.timestamp_after(oldest)
+                assignee, reporter = self.random.choices(users, cum_weights=user_weights, k=2)
+                tasks.append(Task(
+                    title=self.text(3, 8),
+                    project=self.random.choices(projects, cum_weights=project_weights)[0],
+                    status=self.random.choices(statuses, cum_weights=status_weights)[0],
+                    assignee=assignee,
+                    reporter=reporter,
+                    created=created,
+                    updated=self.timestamp_after(created),
+                ))
+
+            with transaction.atomic(), explicit_timestamps(Task, Description, Comment):
+                bulk_create_with_ids(Task, tasks)
+                descriptions = [
+                    Description(task=task, text=self.text(20, 80), created=task.created)
+                    for task in tasks for _ in range(self.descriptions)
+                ]
+                comments = [
+                    Comment(
+                        task=task,
+                        author=self.random.choices(users, cum_weights=user_weights)[0],
+                        text=self.text(5, 40),
+                        created=self.timestamp_after(task.created),
+                    )
+                    for task, count in zip(tasks, comment_counts[start:start + len(tasks)])
+                    for _ in range(count)
+                ]
+                bulk_create_with_ids(Description, descriptions)
+                bulk_create_with_ids(Comment, comments)
+
+            totals[0] += len(tasks)
+            totals[1] += len(descriptions)
+            totals[2] += len(comments)
+            if progress is not None:
+                progress(*totals)
+
+        return tuple(totals)
+
+
+class BenchmarkCase(object):
+    """
+    A request to measure. Write requests run in a transaction rolled back
+    afterwards, so every iteration sees the same data.
+    """
+
+    def __init__(self, name, method, url, data=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+
+    @property
+    def writes(self):
+        return self.method != 'get'
+
+    def request(self, client):
+        if not self.writes:
+            response = client.get(self.url, self.data)
+            return response, len(b''.join(response.streaming_content) if response.streaming else response.content)
+
+        with transaction.atomic():
+            response = getattr(client, self.method)(self.url, json.dumps(self.data), content_type='application/json')
+            transaction.set_rollback(True)
+        return response, len(response.content)
+
+
+def get_benchmark_context():
+    """
+    The names and ids the benchmark cases use, picked from the data in the
+    database: the busiest and a median project, status and assignee, the
+    task with the most comments, a median task, and a common and a rare word.
+    """
+    def busiest(field):
+        counts = list(
+            Task.objects.values_list(field).annotate(tasks=Count('id')).order_by('-tasks', field)
+        )
+        return counts[0][0], counts[len(counts) // 2][0]
+
+    if not Task.objects.exists():
+        return None
+
+    project, median_project = busiest('project__name')
+    status, other_status = busiest('status__name')
+    assignee, _ = busiest('assignee__username')
+    last_task = Task.objects.aggregate(Max('id'))['id__max']
+    median_task = Task.objects.filter(id__lte=last_task // 2 + 1).order_by('-id').values_list('id', flat=True)[0]
+    hot_task = Task.objects.order_by('-comment_count', 'id').values_list('id', flat=True)[0]
+    updated = Task.objects.order_by('-updated').values_list('updated', flat=True)[
+        min(Task.objects.count() - 1, settings.TASK_PAGE_SIZE * 10)
+    ]
+    return {
+        'project': project,
+        'median_project': median_project,
+        'status': status,
+        'other_status': other_status,
+        'assignee': assignee,
+        'hot_task': hot_task,
+        'median_task': median_task,
+        'updated_since': updated.isoformat(),
+        'common_word': WORDS[0],
+        'rare_word': WORDS[-1],
+    }
+
+
+def get_benchmark_cases(context):
+    """
+    The requests measured by `run_bench`: every endpoint, and the task list
+    with each kind of filter, search and ordering. Lists are read one
+    default page at a time, as clients do.
+    """
+    page = {'page_size': settings.TASK_PAGE_SIZE}
+    tasks = reverse('tasks')
+
+    def task_list(name, **params):
+        return BenchmarkCase(name, 'get', tasks, dict(page, **params))
+
+    return [
+        task_list('task-list'),
+        task_list('task-list-max-page', page_size=settings.TASK_MAX_PAGE_SIZE),
+        task_list('task-list-created', ordering='-created'),
+        task_list('task-list-fields', fields='id,title,status,updated'),
+        task_list('task-list-project', project=context['project']),
+        task_list('task-list-status', status=context['status']),
+        task_list('task-list-assignee', assignee=context['assignee']),
+        task_list('task-list-project-status', project=context['project'], status=context['status']),
+        task_list('task-list-status-in', status__in='{},{}'.format(context['status'], context['other_status'])),
+        task_list('task-list-updated-range', updated__gte=context['updated_since']),
+        task_list('task-list-search', search=context['common_word']),
+        task_list('task-list-fts-common', q=context['common_word']),
+        task_list('task-list-fts-rare', q=context['rare_word']),
+        task_list('task-list-fts-project', q=context['common_word'], project=context['project']),
+        BenchmarkCase('task-export-project', 'get', reverse('task-export'), {'project': context['median_project']}),
+        BenchmarkCase('task-changes', 'get', reverse('task-changes'), {'since': 0}),
+        BenchmarkCase('task-stats', 'get', reverse('task-stats')),
+        BenchmarkCase('task-stats-grouped', 'get', reverse('task-stats'), {'group_by': 'project,status,assignee'}),
+        BenchmarkCase('task-stats-project', 'get', reverse('task-stats'), {
+            'project': context['project'], 'group_by': 'status',
+        }),
+        BenchmarkCase('task-detail', 'get', reverse('task-detail', args=(context['median_task'],))),
+        BenchmarkCase('task-detail-hot', 'get', reverse('task-detail', args=(context['hot_task'],))),
+        BenchmarkCase('task-comments-hot', 'get', reverse('task-comments', args=(context['hot_task'],))),
+        BenchmarkCase('comment-list', 'get', reverse('comments'), page),
+        BenchmarkCase('task-create', 'post', tasks, {
+            'title': 'benchmark task',
+            'project': context['project'],
+            'status': context['status'],
+            'assignee': context['assignee'],
+            'reporter': context['assignee'],
+            'descriptions': ['benchmark description'],
+        }),
+        BenchmarkCase('task-update', 'patch', reverse('task-detail', args=(context['median_task'],)), {
+            'status': context['other_status'],
+        }),
+        BenchmarkCase('comment-create', 'post', reverse('comments'), {
+            'task': context['hot_task'],
+            'author': context['assignee'],
+            'text': 'benchmark comment',
+        }),
+        BenchmarkCase('comment-create-bulk', 'post', reverse('comments'), [
+            {'task': task, 'author': context['assignee'], 'text': 'benchmark comment {}'.format(num)}
+            for num, task in enumerate([context['hot_task'], context['median_task']] * 50)
+        ]),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(int(math.ceil(fraction * len(ordered))) - 1, 0)]
+
+
+def run_case(client, case, iterations, warmup=1):
+    """
+    Latency, queries, response size and peak Python memory of `case`.
+    Memory is measured in a separate run, tracing slows the timed ones down.
+    """
+    for _ in range(warmup):
+        case.request(client)
+
+    durations = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response, size = case.request(client)
+            durations.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context))
+        if response.status_code >= 400:
+            raise ValueError('{} answered {}: {}'.format(case.name, response.status_code, response.content[:500]))
+
+    tracemalloc.start()
+    try:
+        case.request(client)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return OrderedDict([
+        ('method', case.method.upper()),
+        ('url', case.url),
+        ('params', case.data if not case.writes else None),
+        ('status', response.status_code),
+        ('queries', max(queries)),
+        ('bytes', size),
+        ('latency_ms', OrderedDict([
+            ('min', round(min(durations), 3)),
+            ('p50', round(statistics.median(durations), 3)),
+            ('p95', round(percentile(durations, 0.95), 3)),
+            ('max', round(max(durations), 3)),
+        ])),
+        ('memory_kb', round(peak / 1024, 1)),
+    ])
+
+
+def run_benchmark(user, iterations=10, warmup=1, names=None, progress=None):
+    """
+    Run the benchmark cases, or those named in `names`, as `user` against
+    the current database. Returns the JSON-serializable results.
+    """
+    context = get_benchmark_context()
+    if context is None:
+        raise ValueError('The database has no tasks, generate some with seed_bench')
+
+    # As `serve` does before forking, also so the query counts do not depend
+    # on which cases ran before and filled the lookup caches
+    warm_up()
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    client.force_login(user)
+    cases = OrderedDict()
+    for case in get_benchmark_cases(context):
+        if names and case.name not in names:
+            continue
+        cases[case.name] = run_case(client, case, iterations, warmup)
+        if progress is not None:
+            progress(case.name, cases[case.name])
+
+    return OrderedDict([
+        ('created', timezone.now().isoformat()),
+        ('iterations', iterations),
+        ('dataset', OrderedDict([
+            ('tasks', Task.objects.count()),
+            ('descriptions', Description.objects.count()),
+            ('comments', Comment.objects.count()),
+            ('projects', Project.objects.count()),
+            ('users', User.objects.count()),
+        ])),
+        ('context', context),
+        ('cases', cases),
+    ])
+
+
+def is_slower(result, base, tolerance=0.2, min_latency_ms=1.0):
+    """
+    Whether the case `result` is slower than `base` by more than `tolerance`
+    and the noise floor `min_latency_ms`. Compared on the fastest run: the
+    other runs add scheduling and GC noise, not cost of the code.
+    """
+    latency, base_latency = result['latency_ms']['min'], base['latency_ms']['min']
+    return latency > base_latency * (1 + tolerance) and latency - base_latency > min_latency_ms
+
+
+def remeasure_slower(results, baseline, rerun, tolerance=0.2, min_latency_ms=1.0, retries=2):
+    """
+    Run again, up to `retries` times, the cases of `results` slower than in
+    `baseline`, keeping the latencies of their fastest run: a slowdown that
+    does not reproduce was a busy machine. `rerun(names)` returns the
+    results of the cases `names`.
+    """
+    for _ in range(retries):
+        names = [
+            name for name, result in results['cases'].items()
+            if name in baseline.get('cases', {}) and is_slower(
+                result, baseline['cases'][name], tolerance, min_latency_ms
+            )
+        ]
+        if not names:
+            return
+        for name, result in rerun(names)['cases'].items():
+            if result['latency_ms']['min'] < results['cases'][name]['latency_ms']['min']:
+                results['cases'][name]['latency_ms'] = result['latency_ms']
+
+
+def compare_results(results, baseline, tolerance=0.2, min_latency_ms=1.0, min_memory_kb=64):
+    """
+    Regressions of `results` against `baseline`, as messages: a case making
+    more queries, slower (see is_slower) or using more memory by more than
+    `tolerance` and more than the noise floor `min_memory_kb`. Cases missing
+    from the baseline are not compared.
+    """
+    regressions = []
+    for name, result in results['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append('{}: {} queries, baseline {}'.format(name, result['queries'], base['queries']))
+
+        if is_slower(result, base, tolerance, min_latency_ms):
+            regressions.append('{}: min {:.1f}ms, baseline {:.1f}ms'.format(
+                name, result['latency_ms']['min'], base['latency_ms']['min']
+            ))
+
+        memory, base_memory = result['memory_kb'], base['memory_kb']
+        if memory > base_memory * (1 + tolerance) and memory - base_memory > min_memory_kb:
+            regressions.append('{}: {:.0f}KB peak memory, baseline {:.0f}KB'.format(name, memory, base_memory))
+    return regressions
@@ -0,0 +1,46 @@
+from django.db import connections, router
+from django.utils import timezone
+from task_tracker.models import Task
+from task_tracker.signals import post_bulk_create, post_bulk_update
+
+
+def bulk_create_with_ids(model, objs, batch_size=None):
+    """
+    `bulk_create` that always leaves primary keys set on the created objects.
+
+    Backends that can return ids from a bulk insert already do so. SQLite
+    cannot, but it holds the database write lock from the first insert until
+    the end of the transaction, so the rows just inserted get the highest,
+    consecutive ids and are numbered from the current maximum. Hence the
+    call must be made inside `transaction.atomic()`.
+
+    Sends `post_bulk_create` with the created objects.
+    """
+    if not objs:
+        return objs
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    assert connection.in_atomic_block, 'bulk_create_with_ids() must be called inside a transaction'
+
+    manager = model._default_manager.using(using)
+    objs = manager.bulk_create(objs, batch_size=batch_size)
+
+    missing = [obj for obj in objs if obj.pk is None]
+    if missing:
+        last_pk = manager.order_by('-pk').values_list('pk', flat=True)[0]
+        for pk, obj in zip(range(last_pk - len(missing) + 1, last_pk + 1), missing):
+            obj.pk = pk
+
+    post_bulk_create.send(sender=model, instances=objs, using=using)
+    return objs
+
+
+def touch_tasks(task_ids, using=None):
+    """
+    Bump `updated` of the given tasks with a single narrow UPDATE.
+    """
+    queryset = Task.objects.using(using).filter(pk__in=task_ids)
+    count = queryset.update(updated=timezone.now())
+    post_bulk_update.send(sender=Task, ids=task_ids, fields=['updated'], using=queryset.db)
+    return count
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.utils import timezone
+from task_tracker.models import TaskChange
+
+
+def record_changes(task_ids, deleted=False, created=False, using=None):
+    """
+    Give the tasks a new change sequence number: their previous change is
+    replaced by a new one, so the log holds one row per task. Created tasks
+    have no previous change, ids are never reused.
+    """
+    task_ids = sorted(set(task_ids))
+    if not task_ids:
+        return
+
+    changes = TaskChange.objects.using(using)
+    now = timezone.now()
+    with transaction.atomic(using=changes.db, savepoint=False):
+        if not created:
+            changes.filter(task_id__in=task_ids).delete()
+        changes.bulk_create([TaskChange(task_id=task_id, deleted=deleted, changed=now) for task_id in task_ids])
+
+
+def get_latest_change(using=None):
+    """
+    (sequence number, time) of the latest change, read from the primary key.
+    """
+    return TaskChange.objects.using(using).order_by('-id').values_list('id', 'changed').first()
+
+
+def get_changes(since, limit, using=None):
+    """
+    Up to `limit` (sequence number, task id, deleted) after the sequence
+    number `since`, in order, and whether there are more.
+    """
+    changes = list(
+        TaskChange.objects.using(using).filter(id__gt=since).order_by('id').values_list(
+            'id', 'task_id', 'deleted'
+        )[:limit + 1]
+    )
+    return changes[:limit], len(changes) > limit
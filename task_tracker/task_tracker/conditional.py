@@ -0,0 +1,47 @@
+import calendar
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers conditional GETs (If-None-Match / If-Modified-Since) with a 304
+    before anything is loaded or serialized.
+
+    Views implement `get_version()`, a cheap query returning a token that
+    changes whenever the response would, and optionally `get_last_modified()`.
+    The ETag also covers the query string and the negotiated media type, as
+    both change the representation.
+    """
+
+    def get_version(self):
+        raise NotImplementedError('`get_version()` must be implemented.')
+
+    def get_last_modified(self, version):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        version = self.get_version()
+        if version is None:
+            return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        etag = quote_etag(hashlib.md5('|'.join([
+            str(version),
+            request.get_full_path(),
+            request.accepted_media_type or '',
+        ]).encode('utf-8')).hexdigest())
+        last_modified = self.get_last_modified(version)
+        if last_modified is not None:
+            last_modified = calendar.timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
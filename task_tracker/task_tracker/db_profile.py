@@ -0,0 +1,28 @@
+import re
+
+from django.conf import settings
+
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(dbapi_connection, pragmas=None):
+    """
+    Run `PRAGMA name = value` for each of `pragmas` (SQLITE_PRAGMAS by
+    default) on a sqlite3 connection, skipping empty values. Executed on the
+    DB-API connection, so it is not counted as a query of a request.
+    """
+    pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+    for name, value in pragmas.items():
+        if value in (None, ''):
+            continue
+        value = str(value)
+        if not PRAGMA_VALUE.match(name) or not PRAGMA_VALUE.match(value):
+            raise ValueError('Invalid SQLite pragma {} = {}'.format(name, value))
+        dbapi_connection.execute('PRAGMA {} = {}'.format(name, value)).fetchall()
+
+
+def get_pragmas(dbapi_connection, names):
+    """
+    Current values of the pragmas `names`, as {name: value}.
+    """
+    return {name: dbapi_connection.execute('PRAGMA {}'.format(name)).fetchone()[0] for name in names}
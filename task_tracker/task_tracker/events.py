@@ -0,0 +1,411 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Task FKs the event stream can be filtered by
+EVENT_FILTER_FIELDS = ('project', 'status', 'assignee')
+
+# Largest datagram sent to or read from a peer socket. Events carry no
+# descriptions or comment lists and only EVENT_TEXT_LENGTH characters of a
+# comment, so they fit; a larger one is only dispatched in its own process
+MAX_DATAGRAM_SIZE = 65536
+
+# Characters of a comment text carried by its event, the full text is read
+# from api/comment/<id>/ when `truncated` is set
+EVENT_TEXT_LENGTH = 1000
+
+# Seconds a listing of the socket directory is reused while its mtime, which
+# may be coarser than the interval between two binds, has not changed
+PEER_LIST_MAX_AGE = 1.0
+
+
+class Event(object):
+    """
+    A task or comment change. `keys` maps each of EVENT_FILTER_FIELDS to the
+    ids the event matches, the old and the new one when the field changed.
+    The payload is encoded once, however many clients the event is sent to.
+    """
+    __slots__ = ('type', 'data', 'keys')
+
+    def __init__(self, type, data, keys):
+        self.type = type
+        self.data = data if isinstance(data, str) else json.dumps(
+            data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')
+        )
+        self.keys = keys
+
+    def encode(self):
+        return json.dumps({
+            'type': self.type,
+            'data': self.data,
+            'keys': {field: sorted(ids) for field, ids in self.keys.items()},
+        }).encode('utf-8')
+
+    @classmethod
+    def decode(cls, raw):
+        value = json.loads(raw.decode('utf-8'))
+        return cls(value['type'], value['data'], {field: set(ids) for field, ids in value['keys'].items()})
+
+    def to_sse(self):
+        return 'event: {}\ndata: {}\n\n'.format(self.type, self.data).encode('utf-8')
+
+
+class Subscription(object):
+    """
+    Events matching `filters` ({field: set of ids}, all fields must match),
+    queued for one client. The publisher never blocks: when the client does
+    not keep up the queue overflows, the subscription is marked and the
+    client is expected to resynchronize.
+    """
+
+    def __init__(self, broker, filters, maxsize):
+        self.broker = broker
+        self.filters = filters
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def matches(self, event):
+        return all(event.keys.get(field, set()) & ids for field, ids in self.filters.items())
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def overflow(self):
+        """
+        Events were lost before reaching the queue.
+        """
+        self.overflowed = True
+
+    def get(self, timeout=None):
+        """
+        The next event, None if there was none for `timeout` seconds.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """
+    Subscription read by coroutines of the event loop `loop`, events put by
+    any thread are handed over to the loop.
+    """
+
+    def __init__(self, broker, filters, maxsize, loop):
+        super(AsyncSubscription, self).__init__(broker, filters, maxsize)
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize, loop=loop)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop is closed, nobody reads this subscription any more
+            self.close()
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        raise TypeError('Read an AsyncSubscription with `get_async()`')
+
+    async def get_async(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker(object):
+    """
+    Publish/subscribe of events between the threads of a process.
+
+    With a `socket_dir`, every process with subscribers also binds a unix
+    datagram socket there, and published events are sent to the sockets of
+    the other processes, so all the workers of a node get every event. A
+    socket left by a dead process is removed by the next publisher.
+
+    Sends never block, a datagram a busy process has no room for is
+    dropped. Every datagram carries the id of the sending broker and its
+    sequence number for the receiving socket, dropped ones included: a
+    receiver seeing a gap marks all of its subscriptions overflowed.
+    """
+
+    def __init__(self, socket_dir=None, queue_size=None):
+        self.socket_dir = socket_dir
+        self.queue_size = queue_size if queue_size is not None else settings.EVENT_QUEUE_SIZE
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._socket = None
+        self._socket_path = None
+        self._socket_pid = None
+        self._sender = None
+        self._sender_id = None
+        self._sender_pid = None
+        self._send_lock = threading.Lock()
+        # Next sequence number for each peer socket, last one received from each sender
+        self._sequences = {}
+        self._received = {}
+        self._peers = None
+        self._peers_mtime = None
+        self._peers_listed = None
+
+    def subscribe(self, filters, subscription_class=Subscription, **kwargs):
+        subscription = subscription_class(self, filters, self.queue_size, **kwargs)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if self.socket_dir and self._socket_pid != os.getpid():
+                self._listen()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def publish(self, events):
+        self.dispatch(events)
+        if self.socket_dir:
+            self._send(events)
+
+    def dispatch(self, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for event in events:
+            for subscription in subscriptions:
+                if subscription.matches(event):
+                    subscription.put(event)
+
+    def overflow(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.overflow()
+
+    def _listen(self):
+        # Also after a fork, the socket and thread of the parent are not ours
+        path = os.path.join(self.socket_dir, '{}.{}.sock'.format(os.getpid(), uuid.uuid4().hex[:8]))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        self._socket, self._socket_path, self._socket_pid = sock, path, os.getpid()
+        atexit.register(self._remove_socket, path)
+        threading.Thread(target=self._receive, args=(sock,), name='event-broker', daemon=True).start()
+
+    @staticmethod
+    def _remove_socket(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _receive(self, sock):
+        while True:
+            try:
+                raw = sock.recv(MAX_DATAGRAM_SIZE)
+            except OSError:
+                return
+            try:
+                header, raw = raw.split(b'\n', 1)
+                sender, sequence = header.decode('ascii').split(' ')
+                sequence = int(sequence)
+                event = Event.decode(raw)
+            except (ValueError, KeyError):
+                logger.warning('Dropped a malformed event datagram')
+                continue
+
+            last = self._received.get(sender)
+            self._received[sender] = sequence
+            if last is not None and sequence != last + 1:
+                logger.warning('Lost %d events from %s', sequence - last - 1, sender)
+                self.overflow()
+            self.dispatch([event])
+
+    def _get_peers(self):
+        """
+        Socket paths of the other processes. The directory is listed again
+        when it changed, or its last listing is older than PEER_LIST_MAX_AGE.
+        """
+        try:
+            mtime = os.stat(self.socket_dir).st_mtime_ns
+        except OSError:
+            return []
+        now = time.monotonic()
+        if self._peers is None or mtime != self._peers_mtime or now - self._peers_listed > PEER_LIST_MAX_AGE:
+            try:
+                names = os.listdir(self.socket_dir)
+            except OSError:
+                return []
+            self._peers = [
+                os.path.join(self.socket_dir, name) for name in names
+                if name.endswith('.sock') and os.path.join(self.socket_dir, name) != self._socket_path
+            ]
+            self._peers_mtime, self._peers_listed = mtime, now
+        return self._peers
+
+    def _send(self, events):
+        with self._send_lock:
+            if self._sender_pid != os.getpid():
+                # Also after a fork, the sequences of the parent are not ours
+                self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                # A worker not reading its socket must not hold up the writes
+                self._sender.setblocking(False)
+                self._sender_id = '{}.{}'.format(os.getpid(), uuid.uuid4().hex[:8])
+                self._sender_pid = os.getpid()
+                self._sequences = {}
+
+            paths = self._get_peers()
+            if not paths:
+                return
+
+            datagrams = []
+            for event in events:
+                datagram = event.encode()
+                # 64 bytes left for the header
+                if len(datagram) > MAX_DATAGRAM_SIZE - 64:
+                    # Left out before it is numbered, so the peers see no gap
+                    logger.error('Event %s of %d bytes not sent to the other processes', event.type, len(datagram))
+                    continue
+                datagrams.append(datagram)
+            if not datagrams:
+                return
+
+            for path in paths:
+                sequence = self._sequences.get(path, 0)
+                self._sequences[path] = sequence + len(datagrams)
+                for offset, datagram in enumerate(datagrams):
+                    header = '{} {}\n'.format(self._sender_id, sequence + offset).encode('ascii')
+                    try:
+                        self._sender.sendto(header + datagram, path)
+                    except (ConnectionRefusedError, FileNotFoundError):
+                        self._remove_socket(path)
+                        self._sequences.pop(path, None)
+                        self._peers = None
+                        break
+                    except OSError as e:
+                        # The receiver finds the gap in the sequence numbers
+                        logger.warning('Dropped events for %s: %s', path, e)
+                        break
+
+
+broker = EventBroker(settings.EVENT_SOCKET_DIR)
+
+
+def publish_on_commit(events, using=None):
+    """
+    Publish `events` once the current transaction commits, right away outside
+    of one. Events of a rolled back transaction are never seen.
+    """
+    events = list(events)
+    if events:
+        transaction.on_commit(lambda: broker.publish(events), using=using)
+
+
+def task_event(type, task, previous=None):
+    """
+    Event of a created, updated or deleted task, `previous` holds the ids of
+    the filter fields before the update.
+    """
+    keys = {field: {getattr(task, field + '_id')} for field in EVENT_FILTER_FIELDS}
+    for field, value in (previous or {}).items():
+        keys[field].add(value)
+
+    if type == 'task.deleted':
+        data = {'id': task.pk}
+    else:
+        data = {
+            'id': task.pk,
+            'title': task.title,
+            'project': task.project.name,
+            'status': task.status.name,
+            'assignee': task.assignee.username,
+            'reporter': task.reporter.username,
+            'updated': task.updated,
+        }
+    return Event(type, data, keys)
+
+
+def comment_event(type, comment, task):
+    """
+    Event of a created, updated or deleted comment, matched by the fields of its task.
+    """
+    keys = {field: {getattr(task, field + '_id')} for field in EVENT_FILTER_FIELDS}
+    if type == 'comment.deleted':
+        data = {'id': comment.pk, 'task': task.pk}
+    else:
+        data = {
+            'id': comment.pk,
+            'task': task.pk,
+            'author': comment.author.username,
+            'text': comment.text[:EVENT_TEXT_LENGTH],
+            'truncated': len(comment.text) > EVENT_TEXT_LENGTH,
+            'created': comment.created,
+        }
+    return Event(type, data, keys)
+
+
+STREAM_START = b': connected\n\n'
+STREAM_KEEPALIVE = b': keepalive\n\n'
+STREAM_OVERFLOW = b'event: overflow\ndata: {}\n\n'
+
+
+def stream_events(subscription, heartbeat=None):
+    """
+    Yield the events of `subscription` in the text/event-stream format, with
+    a comment line every `heartbeat` seconds without events so proxies keep
+    the connection open and a gone client is noticed. An overflowed
+    subscription ends the stream with an `overflow` event.
+    """
+    heartbeat = heartbeat if heartbeat is not None else settings.EVENT_STREAM_HEARTBEAT
+    try:
+        yield STREAM_START
+        while True:
+            event = subscription.get(timeout=heartbeat)
+            if subscription.overflowed:
+                yield STREAM_OVERFLOW
+                return
+            yield event.to_sse() if event is not None else STREAM_KEEPALIVE
+    finally:
+        subscription.close()
+
+
+async def stream_events_async(subscription, heartbeat=None):
+    """
+    `stream_events` of an AsyncSubscription, waiting in the event loop.
+    """
+    heartbeat = heartbeat if heartbeat is not None else settings.EVENT_STREAM_HEARTBEAT
+    try:
+        yield STREAM_START
+        while True:
+            event = await subscription.get_async(timeout=heartbeat)
+            if subscription.overflowed:
+                yield STREAM_OVERFLOW
+                return
+            yield event.to_sse() if event is not None else STREAM_KEEPALIVE
+    finally:
+        subscription.close()
@@ -0,0 +1,214 @@
+import django_filters
+from django_filters.constants import EMPTY_VALUES
+from rest_framework.exceptions import ValidationError
+from django.contrib.auth.models import User
+from task_tracker.lookups import LOOKUP_CACHES
+from task_tracker.models import Project, Status, Task, TaskCounter
+
+# The listing orderings the Task indexes can serve, with the FKs that may be
+# filtered by a single value on top of them: ordering by `updated` uses
+# (updated, id) or one of the (<fk>, updated, id) indexes, ordering by
+# `created` only (created, id).
+ORDERING_INDEXES = {
+    'updated': ('project', 'status', 'assignee'),
+    'created': (),
+}
+
+# The Task fields an index serves a filter on by itself, with the index of a
+# FK (reporter), of its (<fk>, updated, id) or of the description texts. The
+# other filters are only checked on the tasks these select.
+INDEXED_FILTER_FIELDS = ('project', 'status', 'assignee', 'reporter', 'title', 'created', 'updated', 'descriptions')
+
+
+class NameFilter(django_filters.CharFilter):
+    """
+    Filters a task FK by the unique name of the related object. Names are
+    resolved to ids through the NameLookupCache, so the related table is not
+    joined and the FK index is used.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lookup_model = kwargs.pop('lookup_model')
+        super(NameFilter, self).__init__(*args, **kwargs)
+
+    @property
+    def lookup_cache(self):
+        # Not kept on the filter, filters are deep copied for every FilterSet
+        return LOOKUP_CACHES[self.lookup_model]
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        names = value if isinstance(value, list) else [value]
+        ids = [obj.pk for obj in self.lookup_cache.get_many(names).values()]
+        return self.get_method(qs)(**{self.field_name + '__in': ids})
+
+
+class NameInFilter(django_filters.BaseInFilter, NameFilter):
+    pass
+
+
+class IdInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class KeysetOrderingFilter(django_filters.OrderingFilter):
+    """
+    Ordering by a single field, with the id in the same direction as the tie
+    breaker, so the result can be keyset paginated.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = self.get_ordering_value(value[0])
+        return qs.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+
+
+class TaskKeyFilterSet(django_filters.FilterSet):
+    """
+    Filters on the project, status and assignee of a task, the fields the
+    task counters are keyed by: by name or by id, one or several.
+    """
+    project = NameFilter(field_name='project', lookup_model=Project)
+    project__in = NameInFilter(field_name='project', lookup_model=Project)
+    project_id = django_filters.NumberFilter()
+    project_id__in = IdInFilter(field_name='project_id')
+    status = NameFilter(field_name='status', lookup_model=Status)
+    status__in = NameInFilter(field_name='status', lookup_model=Status)
+    status_id = django_filters.NumberFilter()
+    status_id__in = IdInFilter(field_name='status_id')
+    assignee = NameFilter(field_name='assignee', lookup_model=User)
+    assignee__in = NameInFilter(field_name='assignee', lookup_model=User)
+    assignee_id = django_filters.NumberFilter()
+    assignee_id__in = IdInFilter(field_name='assignee_id')
+
+
+class TaskFilter(TaskKeyFilterSet):
+    """
+    Filters of the task list. Related objects can be given by name or by id,
+    one or several (comma separated, `__in`), the timestamps by range.
+    """
+    title = django_filters.CharFilter()
+    reporter = NameFilter(field_name='reporter', lookup_model=User)
+    reporter__in = NameInFilter(field_name='reporter', lookup_model=User)
+    reporter_id = django_filters.NumberFilter()
+    reporter_id__in = IdInFilter(field_name='reporter_id')
+    descriptions = django_filters.CharFilter(field_name='descriptions__text')
+    created__gte = django_filters.IsoDateTimeFilter(field_name='created', lookup_expr='gte')
+    created__lt = django_filters.IsoDateTimeFilter(field_name='created', lookup_expr='lt')
+    updated__gte = django_filters.IsoDateTimeFilter(field_name='updated', lookup_expr='gte')
+    updated__lt = django_filters.IsoDateTimeFilter(field_name='updated', lookup_expr='lt')
+    ordering = KeysetOrderingFilter(fields=tuple(ORDERING_INDEXES))
+
+    class Meta:
+        model = Task
+        fields = []
+
+    def filter_queryset(self, queryset):
+        self.check_filters(self.form.cleaned_data)
+        self.check_ordering(self.form.cleaned_data)
+        return super(TaskFilter, self).filter_queryset(queryset)
+
+    def get_ordering(self, cleaned_data):
+        """
+        The ordering of the list: `ordering`, or when paginated that of the
+        paginator of the view, unless the search ranks the tasks.
+        """
+        ordering = cleaned_data.get('ordering')
+        if ordering or self.request is None or self.request.query_params.get('q') is not None:
+            return ordering
+
+        paginator = getattr(self.request.parser_context.get('view'), 'paginator', None)
+        if paginator is not None and paginator.is_paginating(self.request):
+            return list(paginator.ordering[:1])
+        return ordering
+
+    def check_filters(self, cleaned_data):
+        """
+        Reject filters none of which is served by an index, they would be
+        checked on every task.
+        """
+        names = [name for name, value in cleaned_data.items() if value not in EMPTY_VALUES and name != 'ordering']
+        if names and not any(filter_task_field(self.filters[name]) in INDEXED_FILTER_FIELDS for name in names):
+            message = 'Can only be combined with a filter on {}'.format(', '.join(INDEXED_FILTER_FIELDS))
+            raise ValidationError({name: [message] for name in names})
+
+    def check_ordering(self, cleaned_data):
+        """
+        Reject an ordering the indexes cannot serve together with the other
+        filters, it would sort every matching task for each page.
+        """
+        ordering = self.get_ordering(cleaned_data)
+        if not ordering:
+            return
+
+        if len(ordering) > 1:
+            raise ValidationError({'ordering': ['Only one ordering field is supported']})
+
+        field = ordering[0].lstrip('-')
+        single_value = set()
+        others = set()
+        for name, value in cleaned_data.items():
+            if value in EMPTY_VALUES or name == 'ordering':
+                continue
+            field_name = filter_task_field(self.filters[name])
+            if field_name == field:
+                continue
+            if not name.endswith('__in') and field_name in ORDERING_INDEXES[field]:
+                single_value.add(field_name)
+            others.add(name)
+
+        if others and not single_value:
+            if ORDERING_INDEXES[field]:
+                message = 'Ordering by {} can only be combined with a single {} filter'.format(
+                    field, ', '.join(ORDERING_INDEXES[field])
+                )
+            else:
+                message = 'Ordering by {} can only be combined with {} range filters'.format(field, field)
+            raise ValidationError({'ordering': [message]})
+
+
+class TaskCounterFilter(TaskKeyFilterSet):
+    """
+    Filters of the task stats: the TaskFilter filters of the counted fields.
+    """
+
+    class Meta:
+        model = TaskCounter
+        fields = []
+
+
+# Params accepted by filter_tasks, the ordering of a filter does not select anything
+TASK_FILTER_PARAMS = tuple(name for name in TaskFilter.base_filters if name != 'ordering')
+
+
+def filter_task_field(filter_):
+    """
+    The Task field a filter is on, e.g. status for status_id__in.
+    """
+    # status_id is the status field
+    return Task._meta.get_field(filter_.field_name.split('__')[0]).name
+
+
+def filter_task_param_path(param):
+    """
+    The lookup path on Task a filter param goes through, e.g. status__name.
+    """
+    filter_ = TaskFilter.base_filters[param]
+    path = filter_.field_name.split('__')
+    path[0] = filter_task_field(filter_)
+    if isinstance(filter_, NameFilter):
+        path.append(filter_.lookup_cache.field)
+    return path
+
+
+def filter_tasks(queryset, params):
+    """
+    Apply the TaskFilter params found in `params`, raise a ValidationError
+    if any of them is invalid.
+    """
+    filterset = TaskFilter(params, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
@@ -0,0 +1,186 @@
+import csv
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from task_tracker.bulk import bulk_create_with_ids
+from task_tracker.lookups import status_cache, project_cache, user_cache
+from task_tracker.models import Comment, Description, Task
+
+FORMATS = ('jsonl', 'csv')
+
+
+class RecordError(ValueError):
+    def __init__(self, number, message):
+        super(RecordError, self).__init__('Record {}: {}'.format(number, message))
+        self.number = number
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(fileobj, format, skip=0):
+    """
+    Yield (number, record) for the tasks in `fileobj`, numbered from 1,
+    the first `skip` ones are not parsed.
+
+    A record has the fields of the task export: title, project, status,
+    assignee, reporter, optionally created and updated, descriptions (texts
+    or objects with text and created) and comments (objects with author,
+    text and created). In CSV the descriptions and comments are JSON.
+    """
+    if format == 'csv':
+        for number, row in enumerate(csv.DictReader(fileobj), 1):
+            if number <= skip:
+                continue
+            try:
+                for key in ('descriptions', 'comments'):
+                    row[key] = json.loads(row[key]) if row.get(key) else []
+            except ValueError as e:
+                raise RecordError(number, 'Invalid JSON: {}'.format(e))
+            yield number, row
+        return
+
+    number = 0
+    for line in fileobj:
+        if not line.strip():
+            continue
+        number += 1
+        if number <= skip:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise RecordError(number, 'Invalid JSON: {}'.format(e))
+        if not isinstance(record, dict):
+            raise RecordError(number, 'Expected an object')
+        yield number, record
+
+
+def iterate_batches(records, batch_size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let the auto_now and auto_now_add fields of `models` keep the values set
+    on the objects. The fields are shared by the whole process, this is only
+    meant for management commands.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def parse_timestamp(number, value, default):
+    if value in (None, ''):
+        return default
+    timestamp = parse_datetime(value) if isinstance(value, str) else None
+    if timestamp is None:
+        raise RecordError(number, 'Invalid datetime {}'.format(value))
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, timezone.utc)
+    return timestamp
+
+
+def resolve_names(batch):
+    """
+    {cache: {name: object}} for all names used in the batch, through the
+    lookup caches, with at most one query per model.
+    """
+    names = {status_cache: set(), project_cache: set(), user_cache: set()}
+    for number, record in batch:
+        names[project_cache].add(record.get('project'))
+        names[status_cache].add(record.get('status'))
+        names[user_cache].update([record.get('assignee'), record.get('reporter')])
+        names[user_cache].update(comment.get('author') for comment in record['comments'] if isinstance(comment, dict))
+    return {cache: cache.get_many(values) for cache, values in names.items()}
+
+
+def get_named(resolved, cache, number, name, kind):
+    obj = resolved[cache].get(cache.make_key(name))
+    if obj is None:
+        raise RecordError(number, '{} {} not found'.format(kind, name))
+    return obj
+
+
+def import_batch(batch):
+    """
+    Insert the tasks of `batch`, with their descriptions and comments, with
+    one bulk insert per model. Must be called inside a transaction.
+
+    Returns the number of tasks, descriptions and comments created.
+    """
+    for number, record in batch:
+        for key in ('descriptions', 'comments'):
+            record[key] = record.get(key) or []
+            if not isinstance(record[key], list):
+                raise RecordError(number, '{} must be a list'.format(key))
+
+    resolved = resolve_names(batch)
+    now = timezone.now()
+
+    tasks = []
+    children = []
+    for number, record in batch:
+        title = record.get('title')
+        if not title or not isinstance(title, str) or len(title) > Task._meta.get_field('title').max_length:
+            raise RecordError(number, 'Invalid title {!r}'.format(title))
+        created = parse_timestamp(number, record.get('created'), now)
+        tasks.append(Task(
+            title=title,
+            project=get_named(resolved, project_cache, number, record.get('project'), 'Project'),
+            status=get_named(resolved, status_cache, number, record.get('status'), 'Status'),
+            assignee=get_named(resolved, user_cache, number, record.get('assignee'), 'User'),
+            reporter=get_named(resolved, user_cache, number, record.get('reporter'), 'User'),
+            created=created,
+            updated=parse_timestamp(number, record.get('updated'), created),
+        ))
+        children.append((number, record))
+
+    with explicit_timestamps(Task, Description, Comment):
+        bulk_create_with_ids(Task, tasks)
+
+        descriptions = []
+        comments = []
+        for task, (number, record) in zip(tasks, children):
+            for description in record['descriptions']:
+                if not isinstance(description, dict):
+                    description = {'text': description}
+                descriptions.append(Description(
+                    task=task,
+                    text=str(description.get('text') or ''),
+                    created=parse_timestamp(number, description.get('created'), task.created),
+                ))
+            for comment in record['comments']:
+                if not isinstance(comment, dict):
+                    raise RecordError(number, 'Comments must be objects')
+                comments.append(Comment(
+                    task=task,
+                    author=get_named(resolved, user_cache, number, comment.get('author'), 'User'),
+                    text=str(comment.get('text') or ''),
+                    created=parse_timestamp(number, comment.get('created'), task.created),
+                ))
+
+        bulk_create_with_ids(Description, descriptions)
+        bulk_create_with_ids(Comment, comments)
+
+    return len(tasks), len(descriptions), len(comments)
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from task_tracker.models import Project, Status
+
+
+class NameLookupCache(object):
+    """
+    Bounded per-process cache of reference objects by their unique name.
+
+    Entries are evicted least recently used first and expire after `timeout`
+    seconds, so changes made by other processes are picked up eventually.
+    Changes made by this process are applied through `invalidate`, called from
+    the post_save/post_delete receivers. Objects read inside a transaction are
+    only cached once it commits, a rolled back row never gets into the cache.
+    """
+
+    def __init__(self, model, field, maxsize=None, timeout=None):
+        self.model = model
+        self.field = field
+        self.maxsize = maxsize if maxsize is not None else settings.LOOKUP_CACHE_SIZE
+        self.timeout = timeout if timeout is not None else settings.LOOKUP_CACHE_TIMEOUT
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name):
+        if isinstance(name, bool) or not isinstance(name, (str, int)):
+            return None
+        return str(name)
+
+    def get(self, name):
+        """
+        Return the object named `name`, raise `model.DoesNotExist` if there is none.
+        """
+        key = self.make_key(name)
+        if key is None:
+            raise self.model.DoesNotExist()
+
+        obj = self._get_cached(key)
+        if obj is None:
+            obj = self.model._default_manager.get(**{self.field: key})
+            self._store([obj])
+        return obj
+
+    def get_many(self, names):
+        """
+        Return a {name: object} dict for the known names, with one query for all misses.
+        """
+        found = {}
+        missing = set()
+        for name in names:
+            key = self.make_key(name)
+            if key is None or key in found:
+                continue
+            obj = self._get_cached(key)
+            if obj is None:
+                missing.add(key)
+            else:
+                found[key] = obj
+
+        if missing:
+            objs = list(self.model._default_manager.filter(**{self.field + '__in': missing}))
+            self._store(objs)
+            found.update((getattr(obj, self.field), obj) for obj in objs)
+        return found
+
+    def preload(self):
+        """
+        Fill the cache with up to `maxsize` objects, the newest ones, in one query.
+        """
+        self._store(list(self.model._default_manager.order_by('-pk')[:self.maxsize]))
+
+    def invalidate(self, obj):
+        self._invalidate(obj.pk)
+        # A concurrent reader may have cached the old row before our commit
+        transaction.on_commit(lambda: self._invalidate(obj.pk))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_cached(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, obj = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return obj
+
+    def _store(self, objs):
+        if not objs or not self.maxsize:
+            return
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self._put(objs))
+        else:
+            self._put(objs)
+
+    def _put(self, objs):
+        expires = time.monotonic() + self.timeout
+        with self._lock:
+            for obj in objs:
+                key = getattr(obj, self.field)
+                self._entries[key] = (expires, obj)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _invalidate(self, pk):
+        with self._lock:
+            for key in [key for key, (_, obj) in self._entries.items() if obj.pk == pk]:
+                del self._entries[key]
+
+
+status_cache = NameLookupCache(Status, 'name')
+project_cache = NameLookupCache(Project, 'name')
+user_cache = NameLookupCache(User, 'username')
+
+LOOKUP_CACHES = {
+    Status: status_cache,
+    Project: project_cache,
+    User: user_cache,
+}
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from task_tracker.archive import archive_tasks, get_archivable_ids, get_policy
+from task_tracker.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the tasks in one of the archive statuses and not updated for a number of days, with their '
+        'descriptions and comments, to the archive tables, one transaction per chunk, least recently '
+        'updated first. Defaults: ARCHIVE_STATUSES, ARCHIVE_AFTER_DAYS and ARCHIVE_CHUNK_SIZE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--statuses', help='Comma separated status names')
+        parser.add_argument('--days', type=int, help='Days since the last update')
+        parser.add_argument('--chunk-size', type=int, default=settings.ARCHIVE_CHUNK_SIZE,
+                            help='Tasks archived per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the tasks to archive')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('Days must not be negative')
+        if options['chunk_size'] < 1:
+            raise CommandError('The chunk size must be positive')
+
+        statuses = options['statuses'].split(',') if options['statuses'] is not None else None
+        status_ids, cutoff = get_policy(statuses, options['days'])
+        if not status_ids:
+            raise CommandError('None of the archive statuses exists')
+
+        if options['dry_run']:
+            count = Task.objects.filter(status_id__in=status_ids, updated__lt=cutoff).count()
+            self.stdout.write(self.style.SUCCESS('{} tasks to archive'.format(count)))
+            return
+
+        archived = 0
+        while True:
+            task_ids = get_archivable_ids(status_ids, cutoff, options['chunk_size'])
+            if not task_ids:
+                break
+            with transaction.atomic():
+                # Tasks changed since they were selected are left out
+                archived += len(archive_tasks(task_ids, status_ids, cutoff))
+            self.stdout.write('{} tasks archived'.format(archived))
+        self.stdout.write(self.style.SUCCESS('{} tasks archived'.format(archived)))
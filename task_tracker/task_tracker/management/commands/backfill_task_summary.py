@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from task_tracker.models import Task
+from task_tracker.summary import refresh_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute comment_count, last_commented_at and current_description of all tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of tasks updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        total = 0
+
+        while True:
+            task_ids = list(
+                Task.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not task_ids:
+                break
+            with transaction.atomic():
+                total += refresh_summaries(task_ids)
+            last_pk = task_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS('Updated {} tasks'.format(total)))
@@ -0,0 +1,130 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from task_tracker.db_profile import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE task (id INTEGER PRIMARY KEY, title TEXT NOT NULL, status_id INTEGER NOT NULL, '
+    'updated REAL NOT NULL)',
+    'CREATE INDEX task_status_updated ON task (status_id, updated, id)',
+    'CREATE TABLE counter (status_id INTEGER PRIMARY KEY, count INTEGER NOT NULL)',
+)
+READ = 'SELECT id, title, status_id, updated FROM task WHERE status_id = ? ORDER BY updated DESC, id DESC LIMIT 50'
+# A task status change as the app makes it: read the row, write it and its counters, in one transaction
+WRITE = (
+    ('SELECT status_id FROM task WHERE id = ?', lambda pk, status_id, previous: (pk,)),
+    ('UPDATE task SET status_id = ?, updated = ? WHERE id = ?', lambda pk, status_id, previous: (
+        status_id, time.time(), pk
+    )),
+    ('UPDATE counter SET count = count - 1 WHERE status_id = ?', lambda pk, status_id, previous: (previous,)),
+    ('UPDATE counter SET count = count + 1 WHERE status_id = ?', lambda pk, status_id, previous: (status_id,)),
+)
+STATUSES = 5
+# name, pragmas (None for SQLITE_PRAGMAS), statement opening the write transactions
+PROFILES = (
+    ('stock', {}, 'BEGIN'),
+    ('tuned', None, 'BEGIN'),
+    ('immediate', None, 'BEGIN IMMEDIATE'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the concurrency of the stock SQLite settings, the SQLITE_PRAGMAS profile, and the '
+        'profile with write transactions opened by BEGIN IMMEDIATE as the app backend does: reader '
+        'threads run task list queries and writer threads read-then-write transactions (task row '
+        'and its counters) on a scratch database shaped like the task table. "locked" counts the '
+        'transactions failed with "database is locked".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Tasks in the scratch database')
+        parser.add_argument('--readers', type=int, default=8, help='Reading threads')
+        parser.add_argument('--writers', type=int, default=2, help='Writing threads')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='bench_sqlite')
+        try:
+            seed = os.path.join(directory, 'seed.sqlite3')
+            self.create_seed(seed, options['rows'])
+            self.stdout.write('{:<8} {:>10} {:>10} {:>8}'.format('profile', 'reads/s', 'writes/s', 'locked'))
+            for profile, pragmas, begin in PROFILES:
+                path = os.path.join(directory, '{}.sqlite3'.format(profile))
+                shutil.copy(seed, path)
+                pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+                reads, writes, locked = self.run(path, pragmas, begin, options)
+                self.stdout.write('{:<8} {:>10.0f} {:>10.0f} {:>8}'.format(
+                    profile, reads / options['seconds'], writes / options['seconds'], locked
+                ))
+        finally:
+            shutil.rmtree(directory)
+
+    def create_seed(self, path, rows):
+        connection = sqlite3.connect(path)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        now = time.time()
+        connection.executemany(
+            'INSERT INTO task (id, title, status_id, updated) VALUES (?, ?, ?, ?)',
+            ((pk, 'task #{}'.format(pk), pk % STATUSES, now - pk) for pk in range(1, rows + 1))
+        )
+        connection.execute('INSERT INTO counter SELECT status_id, COUNT(*) FROM task GROUP BY status_id')
+        connection.commit()
+        connection.close()
+
+    def write(self, connection, begin, rows):
+        pk = random.randint(1, rows)
+        status_id = random.randrange(STATUSES)
+        connection.execute(begin)
+        try:
+            previous = None
+            for statement, params in WRITE:
+                row = connection.execute(statement, params(pk, status_id, previous)).fetchone()
+                if previous is None:
+                    previous = row[0]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def run(self, path, pragmas, begin, options):
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def work(write):
+            # Like Django: autocommit, default 5 seconds timeout unless the profile sets busy_timeout
+            connection = sqlite3.connect(path, isolation_level=None)
+            apply_pragmas(connection, pragmas)
+            done = locked = 0
+            while time.monotonic() < deadline:
+                try:
+                    if write:
+                        self.write(connection, begin, options['rows'])
+                    else:
+                        connection.execute(READ, (random.randrange(STATUSES),)).fetchall()
+                    done += 1
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    locked += 1
+            connection.close()
+            with lock:
+                counts['writes' if write else 'reads'] += done
+                counts['locked'] += locked
+
+        threads = [threading.Thread(target=work, args=(False,)) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=work, args=(True,)) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts['reads'], counts['writes'], counts['locked']
@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from task_tracker.importer import FORMATS, RecordError, guess_format, import_batch, iterate_batches, read_records
+from task_tracker.models import ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        'Import tasks with their descriptions and comments from a JSON Lines or CSV file. '
+        'An interrupted import continues after the last imported batch when run again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, e.g. the output of api/task/export/')
+        parser.add_argument('--format', choices=FORMATS, help='Default: csv for .csv files, jsonl otherwise')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tasks imported per transaction')
+        parser.add_argument('--restart', action='store_true', help='Import from the start, ignore the previous run')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError('File {} does not exist'.format(path))
+        format = options['format'] or guess_format(path)
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=os.path.abspath(path)[-255:])
+        position = 0 if options['restart'] else checkpoint.position
+        if position:
+            self.stdout.write('Resuming after record {}'.format(position))
+
+        started = time.monotonic()
+        tasks = descriptions = comments = 0
+        try:
+            with open(path, encoding='utf-8', newline='') as fileobj:
+                records = read_records(fileobj, format, skip=position)
+                for batch in iterate_batches(records, options['batch_size']):
+                    with transaction.atomic():
+                        counts = import_batch(batch)
+                        position = batch[-1][0]
+                        ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(position=position)
+                    tasks += counts[0]
+                    descriptions += counts[1]
+                    comments += counts[2]
+                    self.stdout.write('{} tasks imported, {:.0f} rows/s'.format(
+                        tasks, (tasks + descriptions + comments) / max(time.monotonic() - started, 1e-6)
+                    ))
+        except RecordError as e:
+            raise CommandError('{}. Records up to {} are imported, run again to resume.'.format(e, position))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {} tasks, {} descriptions and {} comments in {:.1f}s ({:.0f} rows/s)'.format(
+                tasks, descriptions, comments, elapsed, (tasks + descriptions + comments) / max(elapsed, 1e-6)
+            )
+        ))
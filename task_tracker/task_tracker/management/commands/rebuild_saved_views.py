@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from task_tracker import saved_views
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized task ids of all saved views'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            views = saved_views.get_views()
+            for view in views:
+                saved_views.rebuild_view(view)
+        self.stdout.write(self.style.SUCCESS('{} saved views rebuilt'.format(len(views))))
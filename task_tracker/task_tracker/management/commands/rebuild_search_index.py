@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from task_tracker import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of task titles, descriptions and comments'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from task_tracker import stats
+
+
+class Command(BaseCommand):
+    help = 'Recount the project x status x assignee task counters of /api/task/stats/ from the tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only compare the counters with the tasks, fail if any is wrong')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            count = stats.rebuild_counters()
+            self.stdout.write(self.style.SUCCESS('{} task counters rebuilt'.format(count)))
+            return
+
+        wrong = stats.verify_counters()
+        for (project_id, status_id, assignee_id), (counter, counted) in wrong.items():
+            self.stderr.write('project {} status {} assignee {}: counter {}, tasks {}'.format(
+                project_id, status_id, assignee_id, counter, counted
+            ))
+        if wrong:
+            raise CommandError('{} task counters are wrong, run rebuild_task_counters'.format(len(wrong)))
+        self.stdout.write(self.style.SUCCESS('Task counters are correct'))
@@ -0,0 +1,73 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from task_tracker.benchmark import compare_results, remeasure_slower, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency, query count, response size and peak memory of every endpoint and of the task '
+        'list filters and searches on the current database (see seed_bench). Results are written as JSON; '
+        'with --baseline the command fails when a case regressed against a previous result file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench0000', help='Username the requests are made as')
+        parser.add_argument('--iterations', type=int, default=10, help='Timed requests per case')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per case first')
+        parser.add_argument('--case', action='append', dest='cases', help='Only run this case, repeatable')
+        parser.add_argument('--output', help='File to write the JSON results to')
+        parser.add_argument('--baseline', help='JSON results to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative increase of latency and memory over the baseline')
+        parser.add_argument('--retries', type=int, default=2,
+                            help='Times a case slower than the baseline is run again before it counts as a regression')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('At least one iteration is needed')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User {} does not exist'.format(options['user']))
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError('Cannot read the baseline: {}'.format(e))
+
+        self.stdout.write('{:<28} {:>6} {:>8} {:>8} {:>8} {:>10} {:>10}'.format(
+            'case', 'status', 'queries', 'p50 ms', 'p95 ms', 'memory KB', 'bytes'
+        ))
+
+        def progress(name, result):
+            self.stdout.write('{:<28} {:>6} {:>8} {:>8.1f} {:>8.1f} {:>10.0f} {:>10}'.format(
+                name, result['status'], result['queries'], result['latency_ms']['p50'],
+                result['latency_ms']['p95'], result['memory_kb'], result['bytes']
+            ))
+
+        try:
+            results = run_benchmark(user, options['iterations'], options['warmup'], options['cases'], progress)
+        except ValueError as e:
+            raise CommandError(e)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+        if baseline is not None:
+            remeasure_slower(
+                results, baseline,
+                lambda names: run_benchmark(user, options['iterations'], options['warmup'], names),
+                options['tolerance'], retries=options['retries']
+            )
+            regressions = compare_results(results, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError('{} regressions against {}'.format(len(regressions), options['baseline']))
+            self.stdout.write(self.style.SUCCESS('No regression against {}'.format(options['baseline'])))
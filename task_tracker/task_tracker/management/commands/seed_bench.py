@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from task_tracker.benchmark import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large, skewed, reproducible dataset for run_bench: a few projects, statuses and users '
+        'hold most tasks and a few hot tasks get most comments. Projects and users are named <prefix>-NNN '
+        'and <prefix>NNNN, all users get the same password.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=100000, help='Tasks to create')
+        parser.add_argument('--comments', type=int, default=1000000, help='Comments to create')
+        parser.add_argument('--descriptions', type=int, default=1, help='Descriptions per task')
+        parser.add_argument('--projects', type=int, default=20, help='Projects to use')
+        parser.add_argument('--users', type=int, default=200, help='Users to use')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Zipf exponent of projects, statuses, users and words, 0 for uniform')
+        parser.add_argument('--comment-skew', type=float, default=0.6,
+                            help='Zipf exponent of the comments per task, 0 for uniform')
+        parser.add_argument('--days', type=int, default=365, help='Age of the oldest task')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed gives the same data')
+        parser.add_argument('--password', default='bench', help='Password of the users')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the project and user names')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of tasks created per transaction')
+
+    def handle(self, *args, **options):
+        if min(options['tasks'], options['comments'], options['descriptions']) < 0:
+            raise CommandError('Counts must not be negative')
+        if options['projects'] < 1 or options['users'] < 1:
+            raise CommandError('At least one project and one user are needed')
+        if options['comments'] and not options['tasks']:
+            raise CommandError('Comments need tasks')
+
+        generator = DatasetGenerator(
+            tasks=options['tasks'],
+            comments=options['comments'],
+            projects=options['projects'],
+            users=options['users'],
+            descriptions=options['descriptions'],
+            skew=options['skew'],
+            comment_skew=options['comment_skew'],
+            days=options['days'],
+            seed=options['seed'],
+            password=options['password'],
+            prefix=options['prefix'],
+        )
+        started = time.monotonic()
+
+        def progress(tasks, descriptions, comments):
+            self.stdout.write('{} tasks created, {:.0f} rows/s'.format(
+                tasks, (tasks + descriptions + comments) / max(time.monotonic() - started, 1e-6)
+            ))
+
+        tasks, descriptions, comments = generator.generate(options['batch_size'], progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Created {} tasks, {} descriptions and {} comments in {:.1f}s ({:.0f} rows/s)'.format(
+                tasks, descriptions, comments, elapsed, (tasks + descriptions + comments) / max(elapsed, 1e-6)
+            )
+        ))
@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, \
+    multiprocess
+
+LATENCY_BUCKETS = (.0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 25, 50, 100)
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUEST_DURATION = Histogram(
+    'task_tracker_request_duration_seconds', 'Time to answer a request',
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'task_tracker_db_queries', 'Database queries made by a request',
+    ['view', 'method'], buckets=QUERY_BUCKETS
+)
+DB_DURATION = Histogram(
+    'task_tracker_db_duration_seconds', 'Time a request spent in database queries',
+    ['view', 'method'], buckets=LATENCY_BUCKETS
+)
+SERIALIZATION_DURATION = Histogram(
+    'task_tracker_serialization_duration_seconds',
+    'Time a request spent in serializers and renderers, database queries excluded',
+    ['view', 'method'], buckets=LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'task_tracker_response_size_bytes', 'Size of the response bodies, streamed ones excepted',
+    ['view', 'method'], buckets=SIZE_BUCKETS
+)
+
+_local = threading.local()
+
+
+class RequestMetrics(object):
+    """
+    What the request served by the current thread has spent so far.
+    """
+    __slots__ = ('queries', 'db_duration', 'serialization_duration', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_duration = 0.0
+        self.serialization_duration = 0.0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries and their time for the
+    current request, installed on every connection.
+    """
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_duration += time.perf_counter() - started
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Add the time spent in the block, minus its database queries, to the
+    serialization time of the current request. Nested blocks count once.
+    """
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None or metrics.serializing:
+        yield
+        return
+
+    metrics.serializing = True
+    started = time.perf_counter()
+    db_duration = metrics.db_duration
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        metrics.serialization_duration += time.perf_counter() - started - (metrics.db_duration - db_duration)
+
+
+def get_registry():
+    """
+    The registry to expose: with PROMETHEUS_MULTIPROC_DIR set, the samples
+    of all the worker processes, merged from the files they write there.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    return generate_latest(get_registry())
+
+
+class MetricsMiddleware(object):
+    """
+    Records per resolved URL name and method the latency, database queries
+    and time, serialization time and response size of every request. Must
+    come first in MIDDLEWARE to cover the time of the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        # Any string can be sent as the method, keep the label values bounded
+        method = request.method if request.method in HTTP_METHODS else 'OTHER'
+        REQUEST_DURATION.labels(view, method, response.status_code).observe(duration)
+        DB_QUERIES.labels(view, method).observe(metrics.queries)
+        DB_DURATION.labels(view, method).observe(metrics.db_duration)
+        SERIALIZATION_DURATION.labels(view, method).observe(metrics.serialization_duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view, method).observe(len(response.content))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view, render them here to time it
+        with timed_serialization():
+            response.render()
+        return response
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE task_tracker_search "
+        "USING fts5(title, body, task_id UNINDEXED, prefix='2 3')"
+    )
+    # Rank by bm25 with title matches weighing twice as much as text matches
+    schema_editor.execute("INSERT INTO task_tracker_search (task_tracker_search, rank) VALUES ('rank', 'bm25(2.0, 1.0)')")
+
+    schema_editor.execute(
+        "INSERT INTO task_tracker_search (rowid, title, body, task_id) "
+        "SELECT id * 3, title, '', id FROM task_tracker_task"
+    )
+    schema_editor.execute(
+        "INSERT INTO task_tracker_search (rowid, title, body, task_id) "
+        "SELECT id * 3 + 1, '', text, task_id FROM task_tracker_description"
+    )
+    schema_editor.execute(
+        "INSERT INTO task_tracker_search (rowid, title, body, task_id) "
+        "SELECT id * 3 + 2, '', text, task_id FROM task_tracker_comment"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute("DROP TABLE task_tracker_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_tracker', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.1.2 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+BACKFILL_SQL = """
+UPDATE task_tracker_task SET
+    comment_count = (
+        SELECT COUNT(*) FROM task_tracker_comment WHERE task_tracker_comment.task_id = task_tracker_task.id
+    ),
+    last_commented_at = (
+        SELECT MAX(created) FROM task_tracker_comment WHERE task_tracker_comment.task_id = task_tracker_task.id
+    ),
+    current_description = COALESCE((
+        SELECT text FROM task_tracker_description
+        WHERE task_tracker_description.task_id = task_tracker_task.id
+        ORDER BY created DESC, id DESC LIMIT 1
+    ), '')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_tracker', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='current_description',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='last_commented_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL([BACKFILL_SQL], migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.1.15 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_tracker', '0004_task_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['task', 'created', 'id'], name='comment_task_created_idx'),
+        ),
+    ]
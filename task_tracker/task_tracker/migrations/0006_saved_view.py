@@ -0,0 +1,43 @@
+# Generated by Django 2.1.15 on 2026-10-18 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('task_tracker', '0005_comment_task_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedView',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('params', models.TextField(default='{}')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_views', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavedViewTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='task_tracker.Task')),
+                ('view', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='task_tracker.SavedView')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='savedviewtask',
+            unique_together={('view', 'task')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='savedview',
+            unique_together={('owner', 'name')},
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.1.15 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+# Existing tasks become the first changes, oldest first
+BACKFILL_SQL = """
+INSERT INTO task_tracker_taskchange (task_id, deleted, changed)
+SELECT id, 1 = 0, updated FROM task_tracker_task
+ORDER BY updated, id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_tracker', '0008_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.IntegerField(db_index=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunSQL([BACKFILL_SQL], migrations.RunSQL.noop),
+    ]
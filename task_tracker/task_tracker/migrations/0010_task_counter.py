@@ -0,0 +1,39 @@
+# Generated by Django 2.1.15 on 2026-10-18 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The counters of the existing tasks
+BACKFILL_SQL = """
+INSERT INTO task_tracker_taskcounter (project_id, status_id, assignee_id, count)
+SELECT project_id, status_id, assignee_id, COUNT(*) FROM task_tracker_task
+GROUP BY project_id, status_id, assignee_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('task_tracker', '0009_task_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('assignee', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='task_tracker.Project')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='task_tracker.Status')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskcounter',
+            unique_together={('project', 'status', 'assignee')},
+        ),
+        migrations.RunSQL([BACKFILL_SQL], migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.1.15 on 2026-10-18 13:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+
+def index_saved_view_params(apps, schema_editor):
+    # The params of the existing saved views
+    SavedView = apps.get_model('task_tracker', 'SavedView')
+    SavedViewParam = apps.get_model('task_tracker', 'SavedViewParam')
+    db_alias = schema_editor.connection.alias
+    SavedViewParam.objects.using(db_alias).bulk_create([
+        SavedViewParam(view_id=view.pk, param=param)
+        for view in SavedView.objects.using(db_alias).only('id', 'params')
+        for param in json.loads(view.params)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_tracker', '0011_task_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedViewParam',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('param', models.CharField(max_length=100)),
+                ('view', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filter_params', to='task_tracker.SavedView')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='savedviewparam',
+            unique_together={('param', 'view')},
+        ),
+        migrations.RunPython(index_saved_view_params, migrations.RunPython.noop),
+    ]
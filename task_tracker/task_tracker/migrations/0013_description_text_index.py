@@ -0,0 +1,17 @@
+# Generated by Django 2.1.15 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_tracker', '0012_saved_view_param'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='description',
+            index=models.Index(fields=['text', 'task'], name='description_text_task_idx'),
+        ),
+    ]
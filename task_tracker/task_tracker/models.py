@@ -1,4 +1,6 @@
-from django.db import models
+import json
+
+from django.db import models, router, transaction
 from django.urls import reverse
 from django.contrib.auth.models import User
 
@@ -33,12 +35,35 @@ class Task(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    # Denormalized from comments and descriptions, maintained by task_tracker.summary
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_commented_at = models.DateTimeField(null=True, blank=True, editable=False)
+    current_description = models.TextField(default='', blank=True, editable=False)
+
+    class Meta:
+        # Serve the TaskFilter filters and orderings, see task_tracker.filters
+        indexes = [
+            models.Index(fields=['updated', 'id'], name='task_updated_id_idx'),
+            models.Index(fields=['created', 'id'], name='task_created_id_idx'),
+            models.Index(fields=['project', 'updated', 'id'], name='task_project_updated_idx'),
+            models.Index(fields=['status', 'updated', 'id'], name='task_status_updated_idx'),
+            models.Index(fields=['assignee', 'updated', 'id'], name='task_assignee_updated_idx'),
+            models.Index(fields=['title'], name='task_title_idx'),
+        ]
+
     def __unicode__(self):
         return str(self.id)
 
     def __str__(self):
         return str(self.id)
 
+    def save(self, *args, **kwargs):
+        # One transaction with the pre_save/post_save receivers, the task
+        # counters are moved from the row as read in it
+        using = kwargs.get('using') or router.db_for_write(Task, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super(Task, self).save(*args, **kwargs)
+
 
 class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
@@ -48,6 +73,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['created', 'id'], name='comment_created_id_idx'),
+            models.Index(fields=['task', 'created', 'id'], name='comment_task_created_idx'),
+        ]
 
     def __unicode__(self):
         return self.text
@@ -61,8 +90,203 @@ class Description(models.Model):
     text = models.TextField(default='')
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Serves the `descriptions` filter of TaskFilter
+        indexes = [
+            models.Index(fields=['text', 'task'], name='description_text_task_idx'),
+        ]
+
+    def __unicode__(self):
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+
+class TaskChange(models.Model):
+    """
+    The latest change of every task, deletions included. The id is the
+    change sequence: a change gets a new row and the previous row of its
+    task is removed, so clients can ask for everything after a sequence
+    number, see task_tracker.changes.
+    """
+    task_id = models.IntegerField(db_index=True)
+    deleted = models.BooleanField(default=False)
+    changed = models.DateTimeField()
+
+    def __unicode__(self):
+        return '{}: {}'.format(self.id, self.task_id)
+
+    def __str__(self):
+        return '{}: {}'.format(self.id, self.task_id)
+
+
+class TaskCounter(models.Model):
+    """
+    Number of tasks per (project, status, assignee), adjusted in the
+    transaction of every task write by task_tracker.stats, so task stats are
+    read from a row per group instead of counting the tasks.
+    """
+    project = models.ForeignKey(Project, on_delete=models.DO_NOTHING, related_name='+')
+    status = models.ForeignKey(Status, on_delete=models.DO_NOTHING, related_name='+')
+    assignee = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('project', 'status', 'assignee')
+
+    def __unicode__(self):
+        return '{}/{}/{}: {}'.format(self.project_id, self.status_id, self.assignee_id, self.count)
+
+    def __str__(self):
+        return '{}/{}/{}: {}'.format(self.project_id, self.status_id, self.assignee_id, self.count)
+
+
+class SavedView(models.Model):
+    """
+    A named set of TaskList filters, whose matching task ids are kept in
+    SavedViewTask by task_tracker.saved_views.
+    """
+    name = models.CharField(max_length=100)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_views')
+    params = models.TextField(default='{}')
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('owner', 'name')
+
+    @property
+    def param_dict(self):
+        return json.loads(self.params)
+
+    @param_dict.setter
+    def param_dict(self, value):
+        self.params = json.dumps(value, sort_keys=True)
+
+    def __unicode__(self):
+        return self.name
+
+    def __str__(self):
+        return self.name
+
+
+class SavedViewParam(models.Model):
+    """
+    A filter param of a saved view: the views a task change may affect are
+    found through the index on the params of the changed fields.
+    """
+    view = models.ForeignKey(SavedView, on_delete=models.CASCADE, related_name='filter_params')
+    param = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('param', 'view')
+
+    def __unicode__(self):
+        return '{}: {}'.format(self.view_id, self.param)
+
+    def __str__(self):
+        return '{}: {}'.format(self.view_id, self.param)
+
+
+class SavedViewTask(models.Model):
+    view = models.ForeignKey(SavedView, on_delete=models.CASCADE, related_name='entries')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('view', 'task')
+
+    def __unicode__(self):
+        return '{}: {}'.format(self.view_id, self.task_id)
+
+    def __str__(self):
+        return '{}: {}'.format(self.view_id, self.task_id)
+
+
+class ArchivedTask(models.Model):
+    """
+    A task moved out of Task by task_tracker.archive, with its id and
+    columns as they were, and when it was archived. Read only.
+    """
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=100)
+    project = models.ForeignKey(Project, on_delete=models.DO_NOTHING, related_name='+')
+    status = models.ForeignKey(Status, on_delete=models.DO_NOTHING, related_name='+')
+    assignee = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='+')
+    reporter = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='+')
+
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+
+    comment_count = models.PositiveIntegerField(default=0)
+    last_commented_at = models.DateTimeField(null=True, blank=True)
+    current_description = models.TextField(default='', blank=True)
+
+    archived = models.DateTimeField()
+
+    class Meta:
+        # The orderings and FK filters of the task list with ?include_archived=1
+        indexes = [
+            models.Index(fields=['updated', 'id'], name='archived_task_updated_idx'),
+            models.Index(fields=['created', 'id'], name='archived_task_created_idx'),
+            models.Index(fields=['project', 'updated', 'id'], name='archived_task_project_idx'),
+            models.Index(fields=['status', 'updated', 'id'], name='archived_task_status_idx'),
+            models.Index(fields=['assignee', 'updated', 'id'], name='archived_task_assignee_idx'),
+        ]
+
+    def __unicode__(self):
+        return str(self.id)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='comments')
+    text = models.TextField(default='')
+    created = models.DateTimeField()
+    author = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='+')
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['task', 'created', 'id'], name='archived_comment_task_idx'),
+        ]
+
     def __unicode__(self):
         return self.text
 
     def __str__(self):
         return self.text
+
+
+class ArchivedDescription(models.Model):
+    id = models.IntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='descriptions')
+    text = models.TextField(default='')
+    created = models.DateTimeField()
+
+    def __unicode__(self):
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Number of records of an import source already in the database, saved in
+    the transaction of each batch, so an interrupted import resumes exactly
+    where it stopped.
+    """
+    source = models.CharField(max_length=255, unique=True)
+    position = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return self.source
+
+    def __str__(self):
+        return self.source
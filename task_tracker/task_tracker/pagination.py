@@ -0,0 +1,184 @@
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over a (timestamp, id) ordering, `ordering` unless the
+    queryset is already ordered by one of `orderings`, or over the (rank, id)
+    ordering of `rank_field`, a float annotation.
+
+    Unless `paginate_by_default` is set, pagination only kicks in when the
+    client sends `cursor` or `page_size`, otherwise the full list is returned.
+    A page is fetched with a range condition on the composite index instead of
+    OFFSET, so its cost does not depend on how deep the client is, and no
+    COUNT(*) is ever issued.
+    """
+    ordering = ('-id',)
+    # Orderings of the queryset kept as they are, any other is replaced by `ordering`
+    orderings = ()
+    rank_field = None
+    page_size = settings.TASK_PAGE_SIZE
+    max_page_size = settings.TASK_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    paginate_by_default = False
+
+    def is_paginating(self, request):
+        return (self.paginate_by_default or
+                self.cursor_query_param in request.query_params or
+                self.page_size_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        Paginate the merge of `querysets`, models sharing the ordering fields
+        and not the ids (live and archived tasks): a page is read from each,
+        the first `page_size` objects of their merge make the page.
+        """
+        if not self.is_paginating(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(querysets[0])
+
+        position = self.decode_cursor(request)
+        if position is not None and isinstance(position[0], float) != (self.key_field == self.rank_field):
+            raise NotFound(self.invalid_cursor_message)
+        results = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*self.ordering)
+            if position is not None:
+                queryset = queryset.filter(self.get_position_filter(*position))
+            results.extend(queryset[:self.page_size + 1])
+        if len(querysets) > 1:
+            results.sort(key=lambda obj: (getattr(obj, self.key_field), obj.pk), reverse=self.descending)
+
+        self.page = results[:self.page_size]
+        if len(results) > self.page_size:
+            last = self.page[-1]
+            self.next_position = (getattr(last, self.key_field), last.pk)
+        else:
+            self.next_position = None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_ordering(self, queryset):
+        ordering = tuple(queryset.query.order_by)
+        return ordering if ordering in self.orderings else self.ordering
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    @property
+    def key_field(self):
+        return self.ordering[0].lstrip('-')
+
+    @property
+    def descending(self):
+        return self.ordering[0].startswith('-')
+
+    def get_position_filter(self, value, pk):
+        # The redundant `lte`/`gte` bound lets the database turn the
+        # row-value comparison into a plain range scan on the index.
+        if self.descending:
+            return Q(**{self.key_field + '__lte': value}) & (
+                Q(**{self.key_field + '__lt': value}) | Q(**{self.key_field: value, 'pk__lt': pk})
+            )
+        return Q(**{self.key_field + '__gte': value}) & (
+            Q(**{self.key_field + '__gt': value}) | Q(**{self.key_field: value, 'pk__gt': pk})
+        )
+
+    def encode_cursor(self, position):
+        value, pk = position
+        raw = '{}|{}'.format(repr(value) if isinstance(value, float) else value.isoformat(), pk)
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            value, pk = raw.rsplit('|', 1)
+            # A timestamp, or the rank of a search result
+            value = parse_datetime(value) or float(value)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        return value, pk
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(title='Cursor', description='The pagination cursor value.')
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(title='Page size', description='Number of results to return per page.')
+            ),
+        ]
+
+
+class TaskPagination(KeysetPagination):
+    ordering = ('-updated', '-id')
+    orderings = (
+        ('-updated', '-id'),
+        ('updated', 'id'),
+        ('-created', '-id'),
+        ('created', 'id'),
+        ('search_rank', 'id'),
+    )
+    # Ranked search results, see TaskSearchMixin
+    rank_field = 'search_rank'
+
+
+class CommentPagination(KeysetPagination):
+    ordering = ('-created', '-id')
+
+
+class TaskCommentPagination(CommentPagination):
+    paginate_by_default = True
@@ -0,0 +1,190 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from task_tracker import changes, db_profile, metrics, saved_views, search, stats, summary
+from task_tracker.lookups import LOOKUP_CACHES
+from task_tracker.models import Comment, Description, SavedView, Task
+from task_tracker.signals import post_bulk_create, post_bulk_update
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        db_profile.apply_pragmas(connection.connection)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
+
+
+def invalidate_lookup(sender, instance, **kwargs):
+    LOOKUP_CACHES[sender].invalidate(instance)
+
+
+for model in LOOKUP_CACHES:
+    post_save.connect(invalidate_lookup, sender=model, dispatch_uid='invalidate_lookup')
+    post_delete.connect(invalidate_lookup, sender=model, dispatch_uid='invalidate_lookup')
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Description)
+@receiver(post_save, sender=Comment)
+def index_search_document(sender, instance, created, update_fields=None, using=None, **kwargs):
+    if sender is Task and not created and update_fields is not None and 'title' not in update_fields:
+        return
+    search.index_objects([instance], using=using)
+
+
+@receiver(post_bulk_create, sender=Task)
+@receiver(post_bulk_create, sender=Description)
+@receiver(post_bulk_create, sender=Comment)
+def index_search_documents(sender, instances, using=None, **kwargs):
+    search.index_objects(instances, using=using)
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Description)
+@receiver(post_delete, sender=Comment)
+def unindex_search_document(sender, instance, using=None, **kwargs):
+    search.unindex_objects([instance], using=using)
+
+
+@receiver(post_save, sender=Comment)
+def add_comment_to_summary(sender, instance, created, using=None, **kwargs):
+    if created:
+        summary.comment_added(instance, using=using)
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_from_summary(sender, instance, using=None, **kwargs):
+    summary.comment_removed(instance, using=using)
+
+
+@receiver(post_save, sender=Description)
+def add_description_to_summary(sender, instance, created, using=None, **kwargs):
+    if created:
+        summary.description_added(instance, using=using)
+
+
+@receiver(post_delete, sender=Description)
+def remove_description_from_summary(sender, instance, using=None, **kwargs):
+    summary.description_removed(instance, using=using)
+
+
+@receiver(post_bulk_create, sender=Description)
+@receiver(post_bulk_create, sender=Comment)
+def refresh_summaries(sender, instances, using=None, **kwargs):
+    summary.refresh_summaries({instance.task_id for instance in instances}, using=using)
+
+
+@receiver(post_save, sender=Task)
+def record_change(sender, instance, created, using=None, **kwargs):
+    changes.record_changes([instance.pk], created=created, using=using)
+
+
+@receiver(post_bulk_create, sender=Task)
+def record_created(sender, instances, using=None, **kwargs):
+    changes.record_changes([instance.pk for instance in instances], created=True, using=using)
+
+
+@receiver(post_bulk_update, sender=Task)
+def record_updated(sender, ids, using=None, **kwargs):
+    changes.record_changes(ids, using=using)
+
+
+@receiver(post_delete, sender=Task)
+def record_deletion(sender, instance, using=None, **kwargs):
+    changes.record_changes([instance.pk], deleted=True, using=using)
+
+
+@receiver(pre_save, sender=Task)
+def read_counter_key(sender, instance, update_fields=None, using=None, **kwargs):
+    # Which counter the stored row is in, read in the transaction of Task.save,
+    # an instance loaded earlier may be stale. Django gives attnames in update_fields
+    # of deferred loads.
+    instance._counter_key = None
+    if (not instance._state.adding and
+            (update_fields is None or set(update_fields) & set(stats.KEY_FIELDS + stats.KEY_ATTNAMES))):
+        instance._counter_key = stats.saved_counter_key(instance, using=using)
+
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, using=None, **kwargs):
+    if created:
+        stats.tasks_added([instance], using=using)
+    elif instance._counter_key is not None:
+        stats.tasks_moved([(instance._counter_key, stats.counter_key(instance))], using=using)
+    instance._counter_key = None
+
+
+@receiver(post_bulk_create, sender=Task)
+def count_created_tasks(sender, instances, using=None, **kwargs):
+    stats.tasks_added(instances, using=using)
+
+
+@receiver(pre_delete, sender=Task)
+def read_deleted_counter_key(sender, instance, using=None, **kwargs):
+    # In the transaction of the delete, as for saves
+    instance._counter_key = stats.saved_counter_key(instance, using=using)
+
+
+@receiver(post_delete, sender=Task)
+def uncount_deleted_task(sender, instance, using=None, **kwargs):
+    key = getattr(instance, '_counter_key', None)
+    if key is not None:
+        stats.adjust_counters({key: -1}, using=using)
+    instance._counter_key = None
+
+
+@receiver(post_save, sender=Task)
+def refresh_saved_views(sender, instance, created, update_fields=None, using=None, **kwargs):
+    params = None if created or update_fields is None else saved_views.params_for_fields(update_fields)
+    saved_views.refresh_tasks([instance.pk], params=params, using=using)
+
+
+@receiver(post_bulk_create, sender=Task)
+def add_to_saved_views(sender, instances, using=None, **kwargs):
+    saved_views.refresh_tasks([instance.pk for instance in instances], using=using)
+
+
+@receiver(post_bulk_update, sender=Task)
+def refresh_saved_views_after_update(sender, ids, fields, using=None, **kwargs):
+    saved_views.refresh_tasks(ids, params=saved_views.params_for_fields(fields), using=using)
+
+
+@receiver(post_save, sender=Description)
+@receiver(post_delete, sender=Description)
+def refresh_saved_views_of_description(sender, instance, using=None, **kwargs):
+    saved_views.refresh_tasks([instance.task_id], params=saved_views.params_for_fields(['descriptions']), using=using)
+
+
+@receiver(post_bulk_create, sender=Description)
+def refresh_saved_views_of_descriptions(sender, instances, using=None, **kwargs):
+    saved_views.refresh_tasks(
+        {instance.task_id for instance in instances},
+        params=saved_views.params_for_fields(['descriptions']),
+        using=using
+    )
+
+
+def rebuild_saved_views_on_rename(sender, instance, created, update_fields=None, using=None, **kwargs):
+    # Views filter on names, so a rename changes which tasks they match
+    if created:
+        return
+    fields = [field.name for field in sender._meta.concrete_fields]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    for view in saved_views.get_views(saved_views.params_for_fields(fields, model=sender), using=using):
+        saved_views.rebuild_view(view, using=using)
+
+
+for model in LOOKUP_CACHES:
+    post_save.connect(rebuild_saved_views_on_rename, sender=model, dispatch_uid='rebuild_saved_views_on_rename')
+
+
+@receiver(post_save, sender=SavedView)
+def rebuild_saved_view(sender, instance, update_fields=None, using=None, **kwargs):
+    if update_fields is None or 'params' in update_fields:
+        saved_views.rebuild_view(instance, using=using)
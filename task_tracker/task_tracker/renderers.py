@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer of lists that can also render them as a stream: `render_stream`
+    takes an iterable of chunks (lists of items) and yields the encoded
+    output chunk by chunk, so a response never holds the whole list.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.render_stream([data if isinstance(data, list) else [data]]))
+
+    def render_stream(self, chunks):
+        raise NotImplementedError('Renderer class requires .render_stream() to be implemented')
+
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """
+    One JSON document per line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render_stream(self, chunks):
+        for chunk in chunks:
+            if chunk:
+                yield ''.join(self.dumps(item) + '\n' for item in chunk).encode(self.charset)
+
+
+class StreamingJSONRenderer(StreamingRenderer):
+    """
+    A JSON array, written item by item.
+    """
+    media_type = 'application/json'
+    format = 'json'
+
+    def render_stream(self, chunks):
+        started = False
+        for chunk in chunks:
+            if chunk:
+                items = ','.join(self.dumps(item) for item in chunk)
+                yield ((',' if started else '[') + items).encode(self.charset)
+                started = True
+        yield (']' if started else '[]').encode(self.charset)
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    A header row with the keys of the first item, then one row per item.
+    Nested values are written as JSON.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render_stream(self, chunks):
+        header = None
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if header is None:
+                header = list(chunk[0])
+                writer.writerow(header)
+            for item in chunk:
+                writer.writerow([self.format_value(item.get(key)) for key in header])
+            yield buffer.getvalue().encode(self.charset)
+
+    def format_value(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, (list, dict)):
+            return self.dumps(value)
+        return value
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Negotiates text/event-stream for the event stream, whose events are
+    written by the view. Renders the responses the view does not stream,
+    such as errors, as a single `error` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return 'event: error\ndata: {}\n\n'.format(StreamingRenderer.dumps(data)).encode(self.charset)
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+from task_tracker.models import TaskChange
+
+# Cookie pinning a client to the primary database after it wrote
+PIN_COOKIE = 'primary_pin'
+# Cache key pinning a user to the primary database after they wrote, from any client
+PIN_CACHE_KEY = 'task_tracker.primary_pin.{}'
+
+_state = threading.local()
+# alias -> (checked at, usable) of the replicas, shared by the threads of a process
+_replica_status = {}
+_replica_status_lock = threading.Lock()
+
+
+def set_replica_reads(enabled, request=None):
+    """
+    Let the reads of the current thread, i.e. of the request it serves, go
+    to a replica. With `request`, unless its user is pinned to the primary:
+    checked at the first read, the view has authenticated the user by then.
+    """
+    _state.replica_reads = enabled
+    _state.request = request
+
+
+def replica_reads_enabled():
+    if not getattr(_state, 'replica_reads', False):
+        return False
+    request, _state.request = _state.request, None
+    if request is not None and is_user_pinned(getattr(request, 'user', None)):
+        _state.replica_reads = False
+    return _state.replica_reads
+
+
+def pin_user(user):
+    """
+    Keep the reads of `user` on the primary for REPLICA_PIN_SECONDS. The
+    pins are shared by the processes of a node with a shared cache, see
+    CACHE_DIR.
+    """
+    if user is not None and user.is_authenticated:
+        cache.set(PIN_CACHE_KEY.format(user.pk), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_user_pinned(user):
+    return user is not None and user.is_authenticated and cache.get(PIN_CACHE_KEY.format(user.pk), False)
+
+
+def get_replica_lag(alias):
+    """
+    Seconds since the oldest task change the replica `alias` does not have
+    yet, 0 when it is up to date. Read from the change log of both databases.
+    """
+    latest = TaskChange.objects.using(alias).order_by('-id').values_list('id', flat=True).first() or 0
+    missing = TaskChange.objects.using('default').filter(id__gt=latest).order_by('id').values_list(
+        'changed', flat=True
+    ).first()
+    if missing is None:
+        return 0
+    return max((timezone.now() - missing).total_seconds(), 0)
+
+
+def is_replica_usable(alias):
+    """
+    Whether the replica `alias` lags at most REPLICA_MAX_LAG seconds, checked
+    at most every REPLICA_CHECK_INTERVAL seconds per process.
+    """
+    now = time.monotonic()
+    with _replica_status_lock:
+        checked, usable = _replica_status.get(alias, (None, False))
+    if checked is not None and now - checked < settings.REPLICA_CHECK_INTERVAL:
+        return usable
+
+    try:
+        usable = get_replica_lag(alias) <= settings.REPLICA_MAX_LAG
+    except DatabaseError:
+        usable = False
+    with _replica_status_lock:
+        _replica_status[alias] = (now, usable)
+    return usable
+
+
+def clear_replica_status():
+    with _replica_status_lock:
+        _replica_status.clear()
+
+
+class ReplicaRouter(object):
+    """
+    Sends the reads of the app models to one of DATABASE_REPLICAS while
+    `set_replica_reads(True)` is in effect, which ReplicaRoutingMiddleware
+    does for the GETs of the views marked `replica_reads`. A replica lagging
+    more than REPLICA_MAX_LAG seconds is left out; without a usable one the
+    reads stay on the primary. Auth and session reads always use the
+    primary, a client must find its fresh session there.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'task_tracker' or not replica_reads_enabled():
+            return None
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if is_replica_usable(alias)]
+        return random.choice(replicas) if replicas else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas are copies of the primary
+        return True
+
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Enables replica reads for GET/HEAD requests to views with a true
+    `replica_reads` attribute, unless the client is pinned to the primary:
+    a successful write sets a cookie keeping the client on the primary for
+    REPLICA_PIN_SECONDS, so it reads its own writes, and pins its user for
+    as long, for their other clients and those ignoring cookies.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            set_replica_reads(False)
+
+        if (settings.DATABASE_REPLICAS and
+                request.method not in ('GET', 'HEAD', 'OPTIONS') and
+                response.status_code < 400):
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+            # Set by the authentication of the view
+            pin_user(getattr(request, 'user', None))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if (settings.DATABASE_REPLICAS and
+                request.method in ('GET', 'HEAD') and
+                getattr(view_class, 'replica_reads', False) and
+                PIN_COOKIE not in request.COOKIES):
+            set_replica_reads(True, request)
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from task_tracker.filters import TASK_FILTER_PARAMS, filter_task_param_path, filter_tasks
+from task_tracker.models import SavedView, SavedViewParam, SavedViewTask, Task
+
+
+def params_for_fields(fields, model=Task):
+    """
+    The TaskFilter params whose lookup goes through one of `fields`,
+    given as field names of `model` (Task, or the model a task FK points to).
+    """
+    depth = 0 if model is Task else 1
+    fields = set(fields)
+    params = []
+    for param in TASK_FILTER_PARAMS:
+        path = filter_task_param_path(param)
+        if len(path) <= depth or path[depth] not in fields:
+            continue
+        if depth and Task._meta.get_field(path[0]).related_model is not model:
+            continue
+        params.append(param)
+    return params
+
+
+def get_views(params=None, using=None):
+    """
+    All saved views, or those filtering on any of `params`, found through
+    the SavedViewParam index.
+    """
+    views = SavedView.objects.using(using).only('id', 'params')
+    if params is None:
+        return list(views)
+    if not params:
+        return []
+    return list(views.filter(
+        pk__in=SavedViewParam.objects.using(using).filter(param__in=set(params)).values('view_id')
+    ))
+
+
+def rebuild_view(view, using=None):
+    """
+    Replace the indexed params and the materialized task ids of `view` with
+    its filters and their result.
+    """
+    SavedViewParam.objects.using(using).filter(view=view).delete()
+    SavedViewParam.objects.using(using).bulk_create(
+        [SavedViewParam(view_id=view.pk, param=param) for param in view.param_dict]
+    )
+    SavedViewTask.objects.using(using).filter(view=view).delete()
+    task_ids = filter_tasks(Task.objects.using(using).order_by(), view.param_dict).values_list('pk', flat=True)
+    SavedViewTask.objects.using(using).bulk_create(
+        [SavedViewTask(view_id=view.pk, task_id=task_id) for task_id in set(task_ids)]
+    )
+
+
+def get_matches(task_ids, views, using=None):
+    """
+    (view id, task id) of the given tasks matching the given views: one
+    query for SAVED_VIEWS_PER_QUERY views, with an EXISTS per view.
+    """
+    tasks = Task.objects.using(using).filter(pk__in=task_ids).order_by()
+    matches = set()
+    for start in range(0, len(views), settings.SAVED_VIEWS_PER_QUERY):
+        columns = {
+            'view_{}'.format(view.pk): Exists(
+                filter_tasks(Task.objects.using(using).filter(pk=OuterRef('pk')), view.param_dict)
+            )
+            for view in views[start:start + settings.SAVED_VIEWS_PER_QUERY]
+        }
+        for row in tasks.annotate(**columns).values('pk', *columns):
+            matches.update((int(column[len('view_'):]), row['pk']) for column in columns if row[column])
+    return matches
+
+
+def refresh_tasks(task_ids, params=None, using=None):
+    """
+    Add the given tasks to the saved views they now match and remove them
+    from those they no longer match. Only views filtering on `params` are
+    checked when given, see get_views and get_matches.
+    """
+    task_ids = set(task_ids)
+    views = get_views(params, using=using) if task_ids else []
+    if not views:
+        return
+
+    entries = SavedViewTask.objects.using(using)
+    existing = set(entries.filter(view__in=views, task_id__in=task_ids).values_list('view_id', 'task_id'))
+    matches = get_matches(task_ids, views, using=using)
+
+    stale = Q()
+    added = []
+    for view in views:
+        matching = {task_id for task_id in task_ids if (view.pk, task_id) in matches}
+        removed = {task_id for task_id in task_ids - matching if (view.pk, task_id) in existing}
+        if removed:
+            stale |= Q(view_id=view.pk, task_id__in=removed)
+        added.extend(
+            SavedViewTask(view_id=view.pk, task_id=task_id)
+            for task_id in matching if (view.pk, task_id) not in existing
+        )
+
+    if stale:
+        entries.filter(stale).delete()
+    if added:
+        entries.bulk_create(added)
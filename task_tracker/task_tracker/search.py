@@ -0,0 +1,199 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from task_tracker.models import Comment, Description, Task
+
+SEARCH_TABLE = 'task_tracker_search'
+
+# Every document is stored under rowid = pk * 3 + kind, so it can be replaced
+# or removed by rowid without scanning the index.
+TASK, DESCRIPTION, COMMENT = 0, 1, 2
+KINDS = {
+    Task: TASK,
+    Description: DESCRIPTION,
+    Comment: COMMENT,
+}
+
+TOKEN_RE = re.compile(r'\w+\*?')
+
+
+def is_supported(connection):
+    return connection.vendor == 'sqlite'
+
+
+def get_connection(using=None):
+    return connections[using or router.db_for_write(Task)]
+
+
+class SubquerySQL(RawSQL):
+    """
+    Raw subquery for an `__in` lookup, which adds the parentheses itself:
+    with those of RawSQL it would compare to the first row only.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def make_rowid(obj):
+    return obj.pk * 3 + KINDS[type(obj)]
+
+
+def make_document(obj):
+    if isinstance(obj, Task):
+        return make_rowid(obj), obj.title, '', obj.pk
+    return make_rowid(obj), '', obj.text, obj.task_id
+
+
+def make_match_query(text):
+    """
+    Turn free text into an FTS5 query: every word is a quoted term, so no
+    query syntax gets through, and a trailing `*` makes it a prefix term.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text):
+        if token.endswith('*'):
+            terms.append('"{}"*'.format(token[:-1]))
+        else:
+            terms.append('"{}"'.format(token))
+    return ' '.join(terms)
+
+
+def index_objects(objs, using=None):
+    """
+    Add or replace tasks, descriptions or comments in the search index.
+    """
+    connection = get_connection(using)
+    if not objs or not is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT OR REPLACE INTO {} (rowid, title, body, task_id) VALUES (%s, %s, %s, %s)'.format(SEARCH_TABLE),
+            [make_document(obj) for obj in objs]
+        )
+
+
+def unindex_objects(objs, using=None):
+    connection = get_connection(using)
+    if not objs or not is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'DELETE FROM {} WHERE rowid = %s'.format(SEARCH_TABLE),
+            [(make_rowid(obj),) for obj in objs]
+        )
+
+
+def rebuild_index(using=None):
+    connection = get_connection(using)
+    if not is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(SEARCH_TABLE))
+        cursor.execute(
+            'INSERT INTO {} (rowid, title, body, task_id) '
+            'SELECT id * 3 + %s, title, \'\', id FROM {}'.format(SEARCH_TABLE, Task._meta.db_table),
+            [TASK]
+        )
+        for model in (Description, Comment):
+            cursor.execute(
+                'INSERT INTO {} (rowid, title, body, task_id) '
+                'SELECT id * 3 + %s, \'\', text, task_id FROM {}'.format(SEARCH_TABLE, model._meta.db_table),
+                [KINDS[model]]
+            )
+
+
+def search_task_ranks(text, queryset=None, after=None, limit=None, using=None):
+    """
+    (id, rank) of the tasks matching `text` in their title, descriptions or
+    comments, best match first, then by id. Title matches weigh twice as
+    much as the rest. Only the tasks of `queryset` if given, its filters
+    are part of the index query, and only those ranked after the (rank, id)
+    position `after`, so a list can be read from the index page by page.
+    """
+    match = make_match_query(text)
+    if not match:
+        return []
+
+    sql = 'SELECT task_id, min(rank) AS task_rank FROM {0} WHERE {0} MATCH %s'.format(SEARCH_TABLE)
+    params = [match]
+    if queryset is not None:
+        using = queryset.db
+        if queryset.query.has_filters():
+            try:
+                subquery, subquery_params = queryset.order_by().values('pk').query.get_compiler(using).as_sql()
+            except EmptyResultSet:
+                return []
+            sql += ' AND task_id IN ({})'.format(subquery)
+            params.extend(subquery_params)
+    sql += ' GROUP BY task_id'
+    if after is not None:
+        sql += ' HAVING task_rank > %s OR (task_rank = %s AND task_id > %s)'
+        params.extend([after[0], after[0], after[1]])
+    sql += ' ORDER BY task_rank, task_id'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+
+    with get_connection(using).cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_task_ids(text, limit=None, using=None):
+    """
+    Ids of the tasks matching `text`, best match first.
+    """
+    return [pk for pk, _ in search_task_ranks(text, limit=limit, using=using)]
+
+
+def can_search(queryset):
+    """
+    Whether the tasks of `queryset` are in the search index.
+    """
+    return queryset.model is Task and is_supported(get_connection(queryset.db))
+
+
+def scan_tasks(queryset, text):
+    """
+    Filter `queryset` down to the tasks containing `text` in their title, a
+    description or a comment, without the index: by scanning them all.
+    """
+    return queryset.filter(
+        Q(title__icontains=text) | Q(descriptions__text__icontains=text) | Q(comments__text__icontains=text)
+    ).distinct()
+
+
+def search_tasks(queryset, text):
+    """
+    Filter `queryset` down to the tasks matching `text`, keeping its ordering.
+    Tasks not in the index are scanned.
+    """
+    if not can_search(queryset):
+        return scan_tasks(queryset, text)
+
+    match = make_match_query(text)
+    if not match:
+        return queryset.none()
+
+    return queryset.filter(
+        pk__in=SubquerySQL('SELECT task_id FROM {0} WHERE {0} MATCH %s'.format(SEARCH_TABLE), [match])
+    )
+
+
+def rank_tasks(queryset, ranks):
+    """
+    Filter `queryset` down to the tasks of `ranks`, (id, rank) pairs, ordered
+    by rank then id. The rank is annotated as `search_rank`, also without
+    any task: the paginator reads its ordering from the queryset.
+    """
+    return queryset.filter(pk__in=[pk for pk, _ in ranks]).annotate(
+        search_rank=Case(*[When(pk=pk, then=Value(rank)) for pk, rank in ranks], output_field=FloatField())
+    ).order_by('search_rank', 'id')
@@ -1,43 +1,85 @@
+from django.conf import settings
 from django.contrib.auth.models import User, Group
-from rest_framework import serializers
-from task_tracker.models import Project, Status, Description, Comment, Task
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from rest_framework import permissions, serializers
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from task_tracker.bulk import bulk_create_with_ids, touch_tasks
+from task_tracker.events import comment_event, publish_on_commit, task_event
+from task_tracker.filters import TASK_FILTER_PARAMS, TaskFilter, filter_tasks
+from task_tracker.metrics import timed_serialization
+from task_tracker.models import Project, Status, Description, Comment, Task, SavedView
+from task_tracker.pagination import TaskCommentPagination
+from task_tracker.signals import post_bulk_update
+from task_tracker.stats import counter_key, tasks_moved
+from task_tracker.summary import refresh_summaries
 from django.core.exceptions import *
+from task_tracker.lookups import status_cache, project_cache, user_cache
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class TimedDataMixin(object):
+    """
+    Counts the time spent building `data` as serialization time in the
+    request metrics.
+    """
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super(TimedDataMixin, self).data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class UserSerializer(TimedDataMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = User
         fields = ('url', 'username', 'email', 'groups')
+        list_serializer_class = TimedListSerializer
 
 
-class GroupSerializer(serializers.HyperlinkedModelSerializer):
+class GroupSerializer(TimedDataMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Group
         fields = ('url', 'name')
+        list_serializer_class = TimedListSerializer
+
 
+class CachedNameField(serializers.RelatedField):
+    """
+    Related field written by a unique name and resolved through a NameLookupCache.
+    """
+    lookup_cache = None
+    not_found_message = '{} not fount'
 
-class StatusField(serializers.RelatedField):
     def to_representation(self, value):
-        return value.name
+        return getattr(value, self.lookup_cache.field)
 
     def to_internal_value(self, data):
+        resolved = self.context.get('resolved_names', {}).get(self.lookup_cache)
+        key = self.lookup_cache.make_key(data)
+        if resolved is not None and key in resolved:
+            return resolved[key]
+
         try:
-            status = Status.objects.get(name=data)
-            return status
+            return self.lookup_cache.get(data)
         except ObjectDoesNotExist:
-            raise ValidationError('Status {} not fount'.format(data))
+            raise ValidationError(self.not_found_message.format(data))
 
 
-class ProjectField(serializers.RelatedField):
-    def to_representation(self, value):
-        return value.name
+class StatusField(CachedNameField):
+    lookup_cache = status_cache
+    not_found_message = 'Status {} not fount'
 
-    def to_internal_value(self, data):
-        try:
-            project = Project.objects.get(name=data)
-            return project
-        except ObjectDoesNotExist:
-            raise ValidationError('Project {} not fount'.format(data))
+
+class ProjectField(CachedNameField):
+    lookup_cache = project_cache
+    not_found_message = 'Project {} not fount'
 
 
 class DescriptionField(serializers.RelatedField):
@@ -51,11 +93,32 @@ class DescriptionField(serializers.RelatedField):
             return data
 
 
+def parse_task_id(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 class TaskField(serializers.RelatedField):
+    def use_pk_only_optimization(self):
+        return True
+
     def to_representation(self, value):
-        return value.id
+        return value.pk
 
     def to_internal_value(self, data):
+        resolved = self.context.get('resolved_tasks')
+        if resolved is not None:
+            pk = parse_task_id(data)
+            if pk is None:
+                raise ValidationError('{}: task id must be integer'.format(data))
+            if pk not in resolved:
+                raise ValidationError('Task {} not fount'.format(data))
+            return resolved[pk]
+
         try:
             task = Task.objects.get(id=data)
             return task
@@ -65,36 +128,163 @@ class TaskField(serializers.RelatedField):
             raise ValidationError('{}: task id must be integer'.format(data))
 
 
-class UserField(serializers.RelatedField):
-    def to_representation(self, value):
-        return value.username
+class UserField(CachedNameField):
+    lookup_cache = user_cache
+    not_found_message = 'User {} not fount'
+
+
+class NameResolvingListSerializer(TimedListSerializer):
+    """
+    Resolves the names of all items of a many=True payload with one query per
+    lookup cache, before the items are validated one by one.
+    """
 
     def to_internal_value(self, data):
-        try:
-            user = User.objects.get(username=data)
-            return user
-        except ObjectDoesNotExist:
-            raise ValidationError('User {} not fount'.format(data))
+        if isinstance(data, list) and len(data) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ['Ensure this list has no more than {} items.'.format(
+                    settings.BULK_MAX_ITEMS
+                )]
+            })
+
+        if isinstance(data, list):
+            names = {}
+            for field in self.child.fields.values():
+                if isinstance(field, CachedNameField) and not field.read_only:
+                    names.setdefault(field.lookup_cache, []).extend(
+                        item.get(field.field_name) for item in data if isinstance(item, dict)
+                    )
+            self.context['resolved_names'] = {
+                cache: cache.get_many(cache_names) for cache, cache_names in names.items()
+            }
+
+        return super(NameResolvingListSerializer, self).to_internal_value(data)
+
+
+class CommentListSerializer(NameResolvingListSerializer):
+    """
+    Creates the comments of a many=True payload, for any number of tasks,
+    with one query to resolve the tasks, one INSERT for the comments and one
+    UPDATE bumping `updated` of their tasks.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) <= settings.BULK_MAX_ITEMS:
+            task_ids = {parse_task_id(item.get('task')) for item in data if isinstance(item, dict)}
+            task_ids.discard(None)
+            # The fields comment events are matched by, the task is not rendered
+            self.context['resolved_tasks'] = Task.objects.only(
+                'id', 'project', 'status', 'assignee'
+            ).in_bulk(task_ids) if task_ids else {}
+
+        return super(CommentListSerializer, self).to_internal_value(data)
+
+    def create(self, validated_data):
+        comments = [Comment(**item) for item in validated_data]
 
+        with transaction.atomic():
+            bulk_create_with_ids(Comment, comments)
+            touch_tasks(sorted({comment.task_id for comment in comments}))
+            publish_on_commit(comment_event('comment.created', comment, comment.task) for comment in comments)
 
-class CommentSerializer(serializers.ModelSerializer):
+        return comments
+
+
+class CommentSerializer(TimedDataMixin, serializers.ModelSerializer):
     author = UserField(queryset=User.objects.all())
     task = TaskField(queryset=Task.objects.all())
 
     class Meta:
         model = Comment
         fields = ('author', 'created', 'text', 'task')
+        list_serializer_class = CommentListSerializer
 
     def create(self, validated_data):
-        comment = super(CommentSerializer, self).create(validated_data)
-        validated_data['task'].save()
+        with transaction.atomic():
+            comment = super(CommentSerializer, self).create(validated_data)
+            # Only `updated`, a save() would write every column of the task
+            touch_tasks([comment.task_id])
+            publish_on_commit([comment_event('comment.created', comment, validated_data['task'])])
 
         return comment
 
+    def update(self, instance, validated_data):
+        old_task_id = instance.task_id
+        with transaction.atomic():
+            comment = super(CommentSerializer, self).update(instance, validated_data)
+            task_ids = {old_task_id, comment.task_id}
+            if len(task_ids) > 1:
+                refresh_summaries(task_ids)
+            touch_tasks(task_ids)
+            publish_on_commit([comment_event('comment.updated', comment, comment.task)])
 
-class TaskSerializer(serializers.ModelSerializer):
+        return comment
+
+
+class SparseFieldsetMixin(object):
+    """
+    Lets GET requests choose the rendered fields. `?fields=` lists the fields
+    to keep and `?expand=` the expandable (nested) fields to add; expandable
+    fields are only rendered by default when neither param is given.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsetMixin, self).__init__(*args, **kwargs)
+        requested = self.get_requested_fields(self.context.get('request'))
+        for field_name in set(self.fields) - requested:
+            self.fields.pop(field_name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        all_fields = set(cls.Meta.fields)
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return all_fields
+
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return all_fields
+
+        if 'fields' in params:
+            fields = set(params['fields'].split(',')) & all_fields
+        else:
+            fields = all_fields - set(cls.expandable_fields)
+        expand = set(params.get('expand', '').split(',')) & set(cls.expandable_fields)
+
+        return fields | expand | {'id'}
+
+
+class TaskListSerializer(NameResolvingListSerializer):
+    def create(self, validated_data):
+        tasks = [
+            Task(
+                title=item['title'],
+                project=item['project'],
+                status=item['status'],
+                assignee=item['assignee'],
+                reporter=item['reporter']
+            )
+            for item in validated_data
+        ]
+
+        with transaction.atomic():
+            bulk_create_with_ids(Task, tasks)
+            bulk_create_with_ids(Description, [
+                Description(task=task, text=desc)
+                for task, item in zip(tasks, validated_data)
+                for desc in item['descriptions']
+            ])
+            publish_on_commit(task_event('task.created', task) for task in tasks)
+
+        prefetch_related_objects(tasks, 'descriptions', 'comments')
+        return tasks
+
+
+class TaskSerializer(TimedDataMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     descriptions = DescriptionField(queryset=Description.objects.all(), many=True)
     comments = CommentSerializer(read_only=True, many=True)
+    comments_next = serializers.SerializerMethodField()
+    archived = serializers.SerializerMethodField()
 
     project = ProjectField(queryset=Project.objects.all())
     status = StatusField(queryset=Status.objects.all())
@@ -114,31 +304,196 @@ class TaskSerializer(serializers.ModelSerializer):
             'updated',
             'descriptions',
             'comments',
+            'comments_next',
+            'comment_count',
+            'last_commented_at',
+            'current_description',
+            'archived',
         )
+        list_serializer_class = TaskListSerializer
 
-    def create(self, validated_data):
-        task = Task.objects.create(
-            title=validated_data['title'],
-            project=validated_data['project'],
-            status=validated_data['status'],
-            assignee=validated_data['assignee'],
-            reporter=validated_data['reporter']
+    expandable_fields = ('descriptions', 'comments')
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        fields = super(TaskSerializer, cls).get_requested_fields(request)
+        if 'comments' in fields:
+            fields.add('comments_next')
+        else:
+            fields.discard('comments_next')
+        return fields
+
+    def get_comments_next(self, instance):
+        """
+        Link to the comments older than the embedded ones, if there are any.
+        """
+        comments = instance.comments.all()
+        if instance.comment_count <= len(comments):
+            return None
+
+        last = comments[len(comments) - 1]
+        url = reverse('task-comments', args=(instance.pk,))
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        pagination = TaskCommentPagination()
+        return replace_query_param(
+            url, pagination.cursor_query_param, pagination.encode_cursor((last.created, last.pk))
         )
 
-        for desc in validated_data['descriptions']:
-            Description.objects.create(task=task, text=desc)
+    def get_archived(self, instance):
+        """
+        When the task was archived, None for a live task.
+        """
+        value = getattr(instance, 'archived', None)
+        return serializers.DateTimeField().to_representation(value) if value is not None else None
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            task = Task.objects.create(
+                title=validated_data['title'],
+                project=validated_data['project'],
+                status=validated_data['status'],
+                assignee=validated_data['assignee'],
+                reporter=validated_data['reporter']
+            )
+
+            bulk_create_with_ids(Description, [
+                Description(task=task, text=desc) for desc in validated_data['descriptions']
+            ])
+            publish_on_commit([task_event('task.created', task)])
 
         return task
 
     def update(self, instance, validated_data):
         status = validated_data.get('status', None)
         assignee = validated_data.get('assignee', None)
+        previous = {'status': instance.status_id, 'assignee': instance.assignee_id}
         if status:
             instance.status = validated_data['status']
         if assignee:
             instance.assignee = validated_data['assignee']
         if status or assignee:
-            instance.save()
+            # With the task counters, adjusted by the post_save receiver
+            with transaction.atomic():
+                instance.save(update_fields=['status', 'assignee', 'updated'])
+                publish_on_commit([task_event('task.updated', instance, previous)])
 
         return instance
 
+
+def validate_task_params(value):
+    unknown = sorted(set(value) - set(TASK_FILTER_PARAMS))
+    if unknown:
+        raise ValidationError('Unknown filter params: {}'.format(', '.join(unknown)))
+    filterset = TaskFilter(value, queryset=Task.objects.none())
+    if not filterset.is_valid():
+        raise ValidationError([
+            '{}: {}'.format(param, ' '.join(errors)) for param, errors in sorted(filterset.errors.items())
+        ])
+    return value
+
+
+class TaskBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    filter = serializers.DictField(child=serializers.CharField(), required=False)
+
+    status = StatusField(queryset=Status.objects.all(), required=False)
+    assignee = UserField(queryset=User.objects.all(), required=False)
+
+    def validate_ids(self, value):
+        if len(value) > settings.BULK_MAX_ITEMS:
+            raise ValidationError('Ensure this list has no more than {} items.'.format(settings.BULK_MAX_ITEMS))
+        return value
+
+    def validate_filter(self, value):
+        if not any(value.values()):
+            raise ValidationError('At least one filter must be given, use ids to select tasks')
+        return validate_task_params(value)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise ValidationError('Either ids or filter must be given')
+        if 'status' not in attrs and 'assignee' not in attrs:
+            raise ValidationError('Nothing to update, status and/or assignee must be given')
+        return attrs
+
+    def get_task_ids(self, validated_data):
+        """
+        Ids of the selected tasks, at most BULK_MAX_ITEMS of them: a filter
+        matching more is rejected, like an ids list longer than that.
+        """
+        if 'ids' in validated_data:
+            return sorted(set(validated_data['ids']))
+
+        queryset = filter_tasks(Task.objects.all(), validated_data['filter'])
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True).distinct()[:settings.BULK_MAX_ITEMS + 1])
+        if len(ids) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError({'filter': [
+                'The filter matches more than {} tasks, narrow it down.'.format(settings.BULK_MAX_ITEMS)
+            ]})
+        return ids
+
+    def create(self, validated_data):
+        changes = {'updated': timezone.now()}
+        for field in ('status', 'assignee'):
+            if field in validated_data:
+                changes[field] = validated_data[field]
+
+        with transaction.atomic():
+            # Read with what the events need, and the values before the update
+            # locked where the database can, on SQLite the transaction holds the write lock
+            tasks = list(Task.objects.filter(pk__in=self.get_task_ids(validated_data)).order_by('pk').select_related(
+                'project', 'status', 'assignee', 'reporter'
+            ).select_for_update(of=('self',)))
+            ids = [task.pk for task in tasks]
+            # The filter ran once, the UPDATE goes by primary key
+            queryset = Task.objects.filter(pk__in=ids)
+            count = queryset.update(**changes)
+            post_bulk_update.send(sender=Task, ids=ids, fields=list(changes), using=queryset.db)
+
+            events = []
+            moves = []
+            for task in tasks:
+                previous = {'status': task.status_id, 'assignee': task.assignee_id}
+                previous_key = counter_key(task)
+                for field, value in changes.items():
+                    setattr(task, field, value)
+                events.append(task_event('task.updated', task, previous))
+                moves.append((previous_key, counter_key(task)))
+            tasks_moved(moves, using=queryset.db)
+            publish_on_commit(events, using=queryset.db)
+
+        return {'count': count, 'ids': ids}
+
+
+class SavedViewSerializer(TimedDataMixin, serializers.ModelSerializer):
+    owner = serializers.ReadOnlyField(source='owner.username')
+    params = serializers.DictField(child=serializers.CharField(), source='param_dict')
+    tasks = serializers.HyperlinkedIdentityField(view_name='saved-view-tasks')
+
+    class Meta:
+        model = SavedView
+        fields = ('id', 'name', 'owner', 'params', 'tasks', 'created', 'updated')
+        list_serializer_class = TimedListSerializer
+
+    def validate_name(self, value):
+        owner = self.instance.owner if self.instance is not None else self.context['request'].user
+        views = SavedView.objects.filter(owner=owner, name=value)
+        if self.instance is not None:
+            views = views.exclude(pk=self.instance.pk)
+        if views.exists():
+            raise ValidationError('Saved view {} already exists'.format(value))
+        return value
+
+    def validate_params(self, value):
+        return validate_task_params(value)
+
+    def create(self, validated_data):
+        # The view is saved together with its materialized task ids
+        with transaction.atomic():
+            return super(SavedViewSerializer, self).create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            return super(SavedViewSerializer, self).update(instance, validated_data)
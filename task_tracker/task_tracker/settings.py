@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+from collections import OrderedDict
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,14 +32,50 @@ ALLOWED_HOSTS = [
 ]
 
 # App settings
-TASK_PARAMS_DICT = {
-    'title': 'title',
-    'project': 'project__name',
-    'status': 'status__name',
-    'assignee': 'assignee__username',
-    'reporter': 'reporter__username',
-    'descriptions': 'descriptions__text'
-}
+# Keyset pagination, enabled per request by `cursor` or `page_size` params
+TASK_PAGE_SIZE = 50
+TASK_MAX_PAGE_SIZE = 500
+
+# Newest comments embedded in a task, the rest is paged at /api/task/<pk>/comments/
+TASK_EMBEDDED_COMMENTS = 20
+
+# Per-process cache of statuses, projects and users by name
+LOOKUP_CACHE_SIZE = 1024
+LOOKUP_CACHE_TIMEOUT = 300
+
+# Maximum number of tasks returned by an unpaginated full-text search (`q` param)
+TASK_SEARCH_LIMIT = 1000
+
+# Maximum number of items in one bulk request
+BULK_MAX_ITEMS = 1000
+
+# Saved views matched against changed tasks in one query, see task_tracker.saved_views
+SAVED_VIEWS_PER_QUERY = 100
+
+# Rows read, prefetched and serialized at a time by streamed lists and exports
+EXPORT_CHUNK_SIZE = 500
+
+# Archival (archive_tasks command): tasks in one of these statuses and not
+# updated for that many days are moved to the archive tables, in
+# transactions of that many tasks
+ARCHIVE_STATUSES = [name for name in os.environ.get('ARCHIVE_STATUSES', 'DONE,CLOSED').split(',') if name]
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+ARCHIVE_CHUNK_SIZE = 500
+
+# Event stream (/api/stream/): events queued per client before it is dropped
+# as too slow, seconds between keepalive comments, and the directory of the
+# sockets fanning events out to the other worker processes (in-process only
+# when unset)
+EVENT_QUEUE_SIZE = 1000
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_SOCKET_DIR = os.environ.get('EVENT_SOCKET_DIR') or None
+
+# Threads running the views under ASGI (asgi.py), at most as many database
+# connections per process; requests over this wait in the event loop
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+# Threads reading streamed responses (exports) under ASGI, a separate pool so
+# long transfers do not hold the threads of the views; as many connections more
+ASGI_STREAM_THREADS = int(os.environ.get('ASGI_STREAM_THREADS', 8))
 
 # Application definition
 
@@ -58,6 +95,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'task_tracker.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +103,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'task_tracker.routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'task_tracker.urls'
@@ -88,6 +127,7 @@ TEMPLATES = [
 
 
 WSGI_APPLICATION = 'task_tracker.wsgi.application'
+ASGI_APPLICATION = 'task_tracker.asgi.application'
 
 
 # Database
@@ -95,11 +135,61 @@ WSGI_APPLICATION = 'task_tracker.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Django's SQLite backend with write transactions opened by BEGIN IMMEDIATE
+        'ENGINE': 'task_tracker.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        # Seconds a connection is kept by its worker thread, 0 closes it after each request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+    }
+}
+
+# Read replicas, comma separated database files in DB_REPLICAS kept up to date
+# from the primary by an external process (litestream, rsync of snapshots...).
+# Reads of the views marked `replica_reads` go to them, see task_tracker.routers.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    DATABASE_REPLICAS.append('replica{}'.format(number))
+    DATABASES[DATABASE_REPLICAS[-1]] = dict(DATABASES['default'], NAME=name, TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['task_tracker.routers.ReplicaRouter']
+
+# Seconds a client, and any client of the same user, reads from the primary after
+# a write, so it sees its own changes
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+# Replicas missing changes older than this many seconds are not read from
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 2))
+# Seconds between two lag checks of a replica, per process
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 1))
+
+# Cache of the per-user primary pins: in CACHE_DIR, shared by the worker
+# processes of a node, when set, per process otherwise
+CACHE_DIR = os.environ.get('CACHE_DIR') or None
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    } if CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# SQLite performance profile, set on every new connection (see task_tracker.db_profile).
+# Each pragma can be changed with the SQLITE_<NAME> environment variable, an
+# empty value leaves the SQLite default.
+# WAL lets readers run alongside the writer, synchronous=NORMAL is durable in WAL
+# mode except for the last transactions on power loss, negative cache_size is in KiB.
+SQLITE_PRAGMAS = OrderedDict(
+    (name, os.environ.get('SQLITE_' + name.upper(), default))
+    for name, default in (
+        ('journal_mode', 'wal'),
+        ('synchronous', 'normal'),
+        ('busy_timeout', '5000'),
+        ('mmap_size', str(256 * 1024 * 1024)),
+        ('cache_size', str(-64 * 1024)),
+        ('temp_store', 'memory'),
+    )
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
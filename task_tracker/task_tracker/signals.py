@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent by the bulk write paths, which bypass the per-object model signals
+post_bulk_create = Signal(providing_args=['instances', 'using'])
+
+# Sent after a queryset update of `fields` on the objects with the given ids
+post_bulk_update = Signal(providing_args=['ids', 'fields', 'using'])
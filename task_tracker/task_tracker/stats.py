@@ -0,0 +1,163 @@
+from collections import Counter, OrderedDict
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Sum
+from task_tracker.models import Task, TaskCounter
+
+# Fields the stats can be grouped by, with the name they are reported by
+GROUP_FIELDS = OrderedDict([
+    ('project', 'project__name'),
+    ('status', 'status__name'),
+    ('assignee', 'assignee__username'),
+])
+# Fields of the task the counters are keyed by, as names and attnames
+KEY_FIELDS = tuple(GROUP_FIELDS)
+KEY_ATTNAMES = tuple(field + '_id' for field in KEY_FIELDS)
+
+
+def counter_key(task):
+    return task.project_id, task.status_id, task.assignee_id
+
+
+def saved_counter_key(task, using=None):
+    """
+    The counter key of the stored row of `task`, None if there is none.
+    Must be read in the transaction of the write: the row is locked where
+    the database can, on SQLite the transaction holds the write lock.
+    """
+    return Task.objects.using(using).select_for_update().filter(pk=task.pk).values_list(
+        'project_id', 'status_id', 'assignee_id'
+    ).first()
+
+
+def supports_upsert(connection):
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 24, 0)
+    return connection.vendor == 'postgresql'
+
+
+def upsert_counters(connection, deltas):
+    table = connection.ops.quote_name(TaskCounter._meta.db_table)
+    count = connection.ops.quote_name('count')
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO {table} (project_id, status_id, assignee_id, {count}) VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT (project_id, status_id, assignee_id) '
+            'DO UPDATE SET {count} = {table}.{count} + excluded.{count}'.format(table=table, count=count),
+            [key + (delta,) for key, delta in deltas]
+        )
+
+
+def adjust_counters(deltas, using=None):
+    """
+    Add {(project_id, status_id, assignee_id): delta} to the counters, with
+    a single upsert where the database has one, an UPDATE per changed group
+    otherwise. Must be called in the transaction of the task write, the
+    counters then change if and only if the tasks do.
+    """
+    # Always in the same order, so concurrent writers do not deadlock
+    deltas = [(key, delta) for key, delta in sorted(deltas.items()) if delta]
+    if not deltas:
+        return
+    counters = TaskCounter.objects.using(using or router.db_for_write(TaskCounter))
+    connection = connections[counters.db]
+    if supports_upsert(connection):
+        upsert_counters(connection, deltas)
+        return
+
+    for (project_id, status_id, assignee_id), delta in deltas:
+        key = {'project_id': project_id, 'status_id': status_id, 'assignee_id': assignee_id}
+        if counters.filter(**key).update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic(using=counters.db):
+                counters.create(count=delta, **key)
+        except IntegrityError:
+            # Created by a concurrent transaction after the update
+            counters.filter(**key).update(count=F('count') + delta)
+
+
+def tasks_added(tasks, using=None):
+    adjust_counters(Counter(counter_key(task) for task in tasks), using=using)
+
+
+def tasks_removed(tasks, using=None):
+    deltas = Counter()
+    deltas.subtract(counter_key(task) for task in tasks)
+    adjust_counters(deltas, using=using)
+
+
+def tasks_moved(moves, using=None):
+    """
+    Move tasks between counters, `moves` being (key before, key after) pairs.
+    """
+    deltas = Counter()
+    for before, after in moves:
+        if before != after:
+            deltas[before] -= 1
+            deltas[after] += 1
+    adjust_counters(deltas, using=using)
+
+
+def get_stats(group_by=(), counters=None):
+    """
+    Number of tasks counted in `counters` (all by default) and, grouped by
+    the `group_by` fields, the number per group by name, largest first.
+    Costs one row per counter read, however many tasks there are.
+    """
+    counters = (counters if counters is not None else TaskCounter.objects.all()).filter(count__gt=0)
+    total = counters.aggregate(total=Sum('count'))['total'] or 0
+    if not group_by:
+        return total, []
+
+    names = [GROUP_FIELDS[field] for field in group_by]
+    rows = counters.values_list(*names).annotate(tasks=Sum('count')).order_by('-tasks', *names)
+    return total, [OrderedDict(zip(tuple(group_by) + ('count',), row)) for row in rows]
+
+
+def count_tasks(using=None):
+    """
+    The counters as counted from the tasks.
+    """
+    rows = Task.objects.using(using).order_by().values_list('project_id', 'status_id', 'assignee_id').annotate(
+        tasks=Count('id')
+    )
+    return Counter({(project_id, status_id, assignee_id): tasks for project_id, status_id, assignee_id, tasks in rows})
+
+
+def read_counters(using=None):
+    rows = TaskCounter.objects.using(using).exclude(count=0).values_list(
+        'project_id', 'status_id', 'assignee_id', 'count'
+    )
+    return Counter({(project_id, status_id, assignee_id): count for project_id, status_id, assignee_id, count in rows})
+
+
+def verify_counters(using=None):
+    """
+    {key: (counter, tasks counted)} of the counters that are wrong.
+    """
+    counters = read_counters(using)
+    counted = count_tasks(using)
+    return {
+        key: (counters[key], counted[key])
+        for key in sorted(set(counters) | set(counted)) if counters[key] != counted[key]
+    }
+
+
+def rebuild_counters(using=None):
+    """
+    Recount all the counters from the tasks in one transaction. On SQLite
+    the transaction holds the write lock from the first DELETE, so no task
+    write gets in between; elsewhere tasks must not be written meanwhile.
+
+    Returns the number of counters.
+    """
+    counters = TaskCounter.objects.using(using)
+    with transaction.atomic(using=counters.db):
+        counters.all().delete()
+        counted = count_tasks(using)
+        counters.bulk_create([
+            TaskCounter(project_id=project_id, status_id=status_id, assignee_id=assignee_id, count=count)
+            for (project_id, status_id, assignee_id), count in sorted(counted.items())
+        ])
+    return len(counted)
@@ -0,0 +1,62 @@
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+from task_tracker.renderers import StreamingRenderer
+
+
+def iterate_in_chunks(queryset, chunk_size=None):
+    """
+    Yield the objects of `queryset` in lists of `chunk_size`, read through
+    a server-side cursor with `iterator()`. The prefetches of the queryset,
+    which `iterator()` ignores, are made for each chunk.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    lookups = queryset._prefetch_related_lookups
+    objects = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
+
+
+class StreamingListMixin(object):
+    """
+    List view mixin streaming the unpaginated list when a StreamingRenderer
+    was negotiated: rows are read, serialized and sent chunk by chunk, so
+    memory use does not depend on the size of the list.
+    """
+
+    def get_list_querysets(self):
+        """
+        The querysets listed, one after the other unless paginated, see
+        KeysetPagination.paginate_querysets.
+        """
+        return [self.filter_queryset(self.get_queryset())]
+
+    def list(self, request, *args, **kwargs):
+        querysets = self.get_list_querysets()
+        renderer = request.accepted_renderer
+        paginator = self.paginator
+        if paginator is not None and paginator.is_paginating(request):
+            page = paginator.paginate_querysets(querysets, request, view=self)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        if not isinstance(renderer, StreamingRenderer):
+            objects = querysets[0] if len(querysets) == 1 else list(chain.from_iterable(querysets))
+            return Response(self.get_serializer(objects, many=True).data)
+
+        chunks = (
+            self.get_serializer(chunk, many=True).data
+            for queryset in querysets
+            for chunk in iterate_in_chunks(queryset)
+        )
+        return StreamingHttpResponse(
+            renderer.render_stream(chunks),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset)
+        )
@@ -0,0 +1,56 @@
+from django.db.models import Count, DateTimeField, F, Subquery, OuterRef, Value
+from django.db.models.functions import Coalesce, Greatest
+from task_tracker.models import Comment, Description, Task
+
+
+def last_comment_created():
+    return Subquery(
+        Comment.objects.filter(task=OuterRef('pk')).order_by('-created', '-pk').values('created')[:1]
+    )
+
+
+def latest_description_text():
+    return Coalesce(
+        Subquery(Description.objects.filter(task=OuterRef('pk')).order_by('-created', '-pk').values('text')[:1]),
+        Value('')
+    )
+
+
+def comment_added(comment, using=None):
+    created = Value(comment.created, output_field=DateTimeField())
+    Task.objects.using(using).filter(pk=comment.task_id).update(
+        comment_count=F('comment_count') + 1,
+        last_commented_at=Greatest(Coalesce(F('last_commented_at'), created), created)
+    )
+
+
+def comment_removed(comment, using=None):
+    Task.objects.using(using).filter(pk=comment.task_id).update(
+        comment_count=F('comment_count') - 1,
+        last_commented_at=last_comment_created()
+    )
+
+
+def description_added(description, using=None):
+    Task.objects.using(using).filter(pk=description.task_id).update(current_description=description.text)
+
+
+def description_removed(description, using=None):
+    Task.objects.using(using).filter(pk=description.task_id).update(current_description=latest_description_text())
+
+
+def refresh_summaries(task_ids, using=None):
+    """
+    Recompute the summary columns of the given tasks from the child tables
+    with a single UPDATE.
+    """
+    comment_count = Subquery(
+        Comment.objects.filter(task=OuterRef('pk')).order_by().values('task').annotate(
+            count=Count('pk')
+        ).values('count')
+    )
+    return Task.objects.using(using).filter(pk__in=task_ids).update(
+        comment_count=Coalesce(comment_count, Value(0)),
+        last_commented_at=last_comment_created(),
+        current_description=latest_description_text()
+    )
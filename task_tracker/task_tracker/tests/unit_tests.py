@@ -1,5 +1,13 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from task_tracker.db_profile import apply_pragmas, get_pragmas
 from task_tracker.models import Project, Status, Description, Comment, Task
+from task_tracker.lookups import LOOKUP_CACHES, NameLookupCache, status_cache, user_cache
+from task_tracker.warmup import warm_up
+import io
 
 
 class ProjectModelTest(TestCase):
@@ -179,3 +187,137 @@ class DescriptionModelTest(TestCase):
         description = Description.objects.get(id=1)
         expected_object_name = '%s' % description.text
         self.assertEquals(expected_object_name, str(description))
+
+
+class NameLookupCacheTest(TransactionTestCase):
+    def setUp(self):
+        Status.objects.create(name='NEW')
+        Status.objects.create(name='DONE')
+
+    def tearDown(self):
+        for cache in LOOKUP_CACHES.values():
+            cache.clear()
+
+    def test_get__cached(self):
+        with self.assertNumQueries(1):
+            status = status_cache.get('NEW')
+        with self.assertNumQueries(0):
+            self.assertEqual(status_cache.get('NEW'), status)
+
+    def test_get__not_found(self):
+        with self.assertRaises(Status.DoesNotExist):
+            status_cache.get('HAHAHA')
+        with self.assertRaises(Status.DoesNotExist):
+            status_cache.get(['NEW'])
+
+    def test_get_many(self):
+        status_cache.get('NEW')
+        with self.assertNumQueries(1):
+            found = status_cache.get_many(['NEW', 'DONE', 'HAHAHA', 'DONE'])
+        self.assertEqual(sorted(found), ['DONE', 'NEW'])
+        with self.assertNumQueries(0):
+            status_cache.get_many(['NEW', 'DONE'])
+
+    def test_invalidate_on_rename(self):
+        status = status_cache.get('NEW')
+        status.name = 'OPEN'
+        status.save()
+        with self.assertRaises(Status.DoesNotExist):
+            status_cache.get('NEW')
+        self.assertEqual(status_cache.get('OPEN').pk, status.pk)
+
+    def test_invalidate_on_delete(self):
+        status_cache.get('DONE')
+        Status.objects.get(name='DONE').delete()
+        with self.assertRaises(Status.DoesNotExist):
+            status_cache.get('DONE')
+
+    def test_invalidate_on_user_save(self):
+        user = User.objects.create_user(username='test_user', password='12345')
+        user_cache.get('test_user')
+        user.email = 'test@example.com'
+        user.save()
+        self.assertEqual(user_cache.get('test_user').email, 'test@example.com')
+
+    def test_not_cached_inside_rolled_back_transaction(self):
+        try:
+            with transaction.atomic():
+                Status.objects.create(name='ROLLED_BACK')
+                status_cache.get('ROLLED_BACK')
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        with self.assertRaises(Status.DoesNotExist):
+            status_cache.get('ROLLED_BACK')
+
+    def test_bounded(self):
+        cache = NameLookupCache(Status, 'name', maxsize=1)
+        cache.get('NEW')
+        cache.get('DONE')
+        with self.assertNumQueries(0):
+            cache.get('DONE')
+        with self.assertNumQueries(1):
+            cache.get('NEW')
+
+    def test_expired(self):
+        cache = NameLookupCache(Status, 'name', timeout=0)
+        cache.get('NEW')
+        with self.assertNumQueries(1):
+            cache.get('NEW')
+
+    def test_preload(self):
+        cache = NameLookupCache(Status, 'name', maxsize=1)
+        cache.preload()
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get('DONE').name, 'DONE')
+        with self.assertNumQueries(1):
+            cache.get('NEW')
+
+    def test_warm_up(self):
+        warm_up()
+        with self.assertNumQueries(0):
+            status_cache.get_many(['NEW', 'DONE'])
+
+    def test_warm_up__first_request(self):
+        User.objects.create_user(username='test_user_1', password='12345')
+        Project.objects.create(name='IT')
+        self.client.login(username='test_user_1', password='12345')
+        for cache in LOOKUP_CACHES.values():
+            cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/api/task/?status=NEW&project=IT')
+
+        for cache in LOOKUP_CACHES.values():
+            cache.clear()
+        warm_up()
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get('/api/task/?status=NEW&project=IT')
+        # The names are resolved from the preloaded caches
+        self.assertEqual(len(cold) - len(warm), 2)
+        self.assertFalse([query for query in warm.captured_queries if 'FROM "task_tracker_project"' in query['sql']])
+
+
+class SQLiteProfileTest(TestCase):
+    def test_pragmas_applied(self):
+        connection.ensure_connection()
+        # The test database is in memory, its journal mode cannot be WAL
+        self.assertEqual(get_pragmas(connection.connection, ['synchronous', 'busy_timeout', 'temp_store']),
+                         {'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2})
+
+    def test_invalid_pragma(self):
+        with self.assertRaises(ValueError):
+            apply_pragmas(connection.connection, {'cache_size': '1; DROP TABLE task'})
+
+    def test_benchmark(self):
+        out = io.StringIO()
+        call_command('bench_sqlite', rows=100, readers=2, writers=1, seconds=0.1, stdout=out)
+        self.assertEqual([line.split()[0] for line in out.getvalue().splitlines()],
+                         ['profile', 'stock', 'tuned', 'immediate'])
+
+
+class SQLiteBackendTest(TransactionTestCase):
+    def test_transactions_take_the_write_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Status.objects.count()
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils.six.moves.urllib.parse import urlparse
+
+
+# Maximum number of queries per (url name, method), session and user lookups
+# included. The numbers must not depend on the amount of data returned.
+QUERY_BUDGETS = {
+    # Filters by name add a lookup query when the name cache is cold
+    ('tasks', 'get'): 7,
+    ('task-detail', 'get'): 6,
+    ('task-comments', 'get'): 4,
+    ('comments', 'get'): 4,
+    ('comment-detail', 'get'): 3,
+    ('saved-view-tasks', 'get'): 7,
+}
+
+
+class QueryBudgetMixin(object):
+    """
+    Test case mixin that fails a request to an endpoint issuing more queries
+    than declared for it in `query_budgets`.
+    """
+    query_budgets = QUERY_BUDGETS
+
+    def request_within_budget(self, method, url, *args, **kwargs):
+        url_name = resolve(urlparse(url).path).url_name
+        key = (url_name, method)
+        if key not in self.query_budgets:
+            self.fail('No query budget declared for {} {}'.format(method.upper(), url_name))
+        budget = self.query_budgets[key]
+
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, *args, **kwargs)
+
+        if len(context) > budget:
+            self.fail('{} {} made {} queries, budget is {}:\n{}'.format(
+                method.upper(),
+                url,
+                len(context),
+                budget,
+                '\n'.join(query['sql'] for query in context.captured_queries)
+            ))
+        return response
@@ -17,7 +17,9 @@ from django.contrib import admin
 from django.urls import path
 from rest_framework import routers
 from django.conf.urls import url, include
-from task_tracker.views import UserViewSet, GroupViewSet, TaskList, TaskDetail, CommentList, CommentDetail
+from task_tracker.views import UserViewSet, GroupViewSet, TaskList, TaskDetail, TaskBulkUpdate, TaskExport, \
+    TaskChangeList, TaskStats, TaskCommentList, CommentList, CommentDetail, SavedViewList, SavedViewDetail, \
+    SavedViewTaskList, EventStream, metrics
 from rest_framework.urlpatterns import format_suffix_patterns
 
 
@@ -30,11 +32,21 @@ router = routers.DefaultRouter()
 urlpatterns = [
     path('admin/', admin.site.urls),
     url(r'^api/', include(user_router.urls)),
+    url(r'^metrics$', metrics, name='metrics'),
 ]
 
 urlpatterns += format_suffix_patterns([
     url(r'^api/task/$', TaskList.as_view(), name='tasks'),
     url(r'^api/task/(?P<pk>[0-9]+)/$', TaskDetail.as_view(), name='task-detail'),
+    url(r'^api/task/(?P<pk>[0-9]+)/comments/$', TaskCommentList.as_view(), name='task-comments'),
+    url(r'^api/task/bulk/$', TaskBulkUpdate.as_view(), name='task-bulk-update'),
+    url(r'^api/task/export/$', TaskExport.as_view(), name='task-export'),
+    url(r'^api/task/changes/$', TaskChangeList.as_view(), name='task-changes'),
+    url(r'^api/task/stats/$', TaskStats.as_view(), name='task-stats'),
     url(r'^api/comment/$', CommentList.as_view(), name='comments'),
     url(r'^api/comment/(?P<pk>[0-9]+)/$', CommentDetail.as_view(), name='comment-detail'),
+    url(r'^api/views/$', SavedViewList.as_view(), name='saved-views'),
+    url(r'^api/views/(?P<pk>[0-9]+)/$', SavedViewDetail.as_view(), name='saved-view-detail'),
+    url(r'^api/views/(?P<pk>[0-9]+)/tasks/$', SavedViewTaskList.as_view(), name='saved-view-tasks'),
+    url(r'^api/stream/$', EventStream.as_view(), name='event-stream'),
 ])
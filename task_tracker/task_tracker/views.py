@@ -1,11 +1,237 @@
 import django_filters.rest_framework
 from django.contrib.auth.models import User, Group
 from rest_framework import viewsets
-from task_tracker.serializers import UserSerializer, GroupSerializer, TaskSerializer, CommentSerializer
-from task_tracker.models import Task, Comment
+from task_tracker.serializers import UserSerializer, GroupSerializer, TaskSerializer, CommentSerializer, \
+    TaskBulkUpdateSerializer, SavedViewSerializer
+from task_tracker.bulk import touch_tasks
+from task_tracker.changes import get_changes, get_latest_change
+from task_tracker.conditional import ConditionalGetMixin
+from task_tracker.asgi_handler import EVENT_LOOP_KEY
+from task_tracker.events import EVENT_FILTER_FIELDS, AsyncSubscription, broker, comment_event, publish_on_commit, \
+    stream_events, stream_events_async, task_event
+from task_tracker.filters import TaskCounterFilter, TaskFilter, filter_tasks
+from task_tracker.lookups import LOOKUP_CACHES
+from task_tracker.metrics import CONTENT_TYPE_LATEST, render_metrics
+from task_tracker.models import Project, Status, Task, TaskCounter, Comment, SavedView, SavedViewTask, ArchivedTask, \
+    ArchivedComment
+from task_tracker.pagination import TaskPagination, CommentPagination, TaskCommentPagination
+from task_tracker.renderers import NDJSONRenderer, CSVRenderer, StreamingJSONRenderer, EventStreamRenderer
+from task_tracker.search import SubquerySQL, can_search, rank_tasks, search_task_ranks, search_tasks
+from task_tracker.stats import GROUP_FIELDS, get_stats
+from task_tracker.streaming import StreamingListMixin
 from rest_framework import generics, filters
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Prefetch, Q, QuerySet, Value
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from collections import OrderedDict
+
+
+# Tasks per UNION ALL of EmbeddedCommentQuerySet, SQLite's default SQLITE_MAX_COMPOUND_SELECT
+EMBEDDED_COMMENTS_UNION_SIZE = 500
+
+
+class EmbeddedCommentQuerySet(QuerySet):
+    """
+    Comments of the prefetch of the comments embedded in tasks: the
+    `task__in` filter the prefetch adds keeps the newest
+    TASK_EMBEDDED_COMMENTS comments of each task only. They are found by one
+    LIMIT scan of the (task, created, id) index per task, the scans joined
+    with UNION ALL, whatever the number of comments of a task.
+    """
+
+    def filter(self, *args, **kwargs):
+        tasks = kwargs.pop('task__in', None)
+        queryset = super(EmbeddedCommentQuerySet, self).filter(*args, **kwargs)
+        if tasks is None:
+            return queryset
+
+        task_ids = [getattr(task, 'pk', task) for task in tasks]
+        if not task_ids:
+            return queryset.none()
+
+        quote = connections[self.db].ops.quote_name
+        newest = (
+            'SELECT * FROM (SELECT {id} FROM {table} WHERE {task} = %s ORDER BY {created} DESC, {id} DESC '
+            'LIMIT {limit}) AS newest'
+        ).format(
+            id=quote('id'), table=quote(self.model._meta.db_table), task=quote('task_id'), created=quote('created'),
+            limit=int(settings.TASK_EMBEDDED_COMMENTS)
+        )
+        condition = Q()
+        for start in range(0, len(task_ids), EMBEDDED_COMMENTS_UNION_SIZE):
+            chunk = task_ids[start:start + EMBEDDED_COMMENTS_UNION_SIZE]
+            condition |= Q(pk__in=SubquerySQL(' UNION ALL '.join([newest] * len(chunk)), chunk))
+        return queryset.filter(condition)
+
+
+def get_embedded_comments(model=Comment):
+    """
+    The newest TASK_EMBEDDED_COMMENTS comments of each task, for a prefetch,
+    see EmbeddedCommentQuerySet.
+    """
+    return EmbeddedCommentQuerySet(model).select_related('author').order_by('-created', '-id')
+
+
+# Columns and relations needed to render each TaskSerializer field
+TASK_FIELD_COLUMNS = {
+    'project': ('project', 'project__name'),
+    'status': ('status', 'status__name'),
+    'assignee': ('assignee', 'assignee__username'),
+    'reporter': ('reporter', 'reporter__username'),
+    'descriptions': (),
+    'comments': ('comment_count',),
+    'comments_next': ('comment_count',),
+    'archived': (),
+}
+TASK_RELATED_FIELDS = ('project', 'status', 'assignee', 'reporter')
+TASK_FIELD_PREFETCHES = {
+    'descriptions': lambda archived: 'descriptions',
+    'comments': lambda archived: Prefetch(
+        'comments', queryset=get_embedded_comments(ArchivedComment if archived else Comment)
+    ),
+}
+
+
+def get_task_queryset(fields=None, archived=False):
+    """
+    Tasks with the graph rendered by TaskSerializer loaded up front: joins for
+    the FKs and one prefetch each for descriptions and the newest comments.
+    When `fields` is given, only what those fields need is loaded. With
+    `archived`, the archived tasks, see task_tracker.archive.
+    """
+    if fields is None:
+        fields = TaskSerializer.Meta.fields
+
+    # id and updated are always loaded, keyset pagination needs them
+    columns = {'id', 'updated', 'archived'} if archived else {'id', 'updated'}
+    related = []
+    prefetches = []
+    for field in fields:
+        columns.update(TASK_FIELD_COLUMNS.get(field, (field,)))
+        if field in TASK_RELATED_FIELDS:
+            related.append(field)
+        if field in TASK_FIELD_PREFETCHES:
+            prefetches.append(TASK_FIELD_PREFETCHES[field](archived))
+
+    model = ArchivedTask if archived else Task
+    queryset = model.objects.prefetch_related(*prefetches).only(*columns)
+    # select_related() without arguments would follow every FK
+    return queryset.select_related(*related) if related else queryset
+
+
+def get_tasks_version():
+    """
+    Changes whenever any task is created, changed or deleted: the sequence
+    number and time of the latest change.
+    """
+    return get_latest_change() or (0, None)
+
+
+def get_tasks_last_modified(version):
+    return version[-1]
+
+
+class TaskFieldsetMixin(object):
+    """
+    Builds the queryset of the task views from the fields requested with
+    `?fields=` and `?expand=`.
+    """
+
+    def get_task_queryset(self, archived=False):
+        return get_task_queryset(TaskSerializer.get_requested_fields(self.request), archived)
+
+
+class IncludeArchivedMixin(object):
+    """
+    With `?include_archived=1` the task list also has the archived tasks
+    matching the filters: after the live ones, or merged with them page by
+    page when paginated.
+    """
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived') in ('1', 'true')
+
+    def get_archived_queryset(self):
+        queryset = self.get_task_queryset(archived=True)
+        for backend in self.filter_backends:
+            # Its FilterSet model check rejects ArchivedTask, the filters apply as they are
+            if not issubclass(backend, django_filters.rest_framework.DjangoFilterBackend):
+                queryset = backend().filter_queryset(self.request, queryset, self)
+        return filter_tasks(queryset, self.request.query_params)
+
+    def get_list_querysets(self):
+        querysets = super(IncludeArchivedMixin, self).get_list_querysets()
+        if self.include_archived():
+            querysets.append(self.get_archived_queryset())
+        return querysets
+
+
+class TaskSearchMixin(object):
+    """
+    Full-text search of the task list, `?q=`, run after the filters: they
+    are part of the index query, so every matching task can be listed. The
+    tasks are ordered by rank unless `ordering` is given, a paginated list
+    is read from the index page by page. Unpaginated, the best
+    TASK_SEARCH_LIMIT tasks are listed, with `X-Search-Truncated: true` when
+    more match. Archived tasks are not in the search index, `q` scans them,
+    they rank after the live ones.
+    """
+    search_truncated = False
+
+    def get_search_text(self):
+        return self.request.query_params.get('q', None)
+
+    def is_ranked(self):
+        return not self.request.query_params.get('ordering')
+
+    def get_search_position(self, paginator):
+        position = paginator.decode_cursor(self.request)
+        if position is not None and not isinstance(position[0], float):
+            raise NotFound(paginator.invalid_cursor_message)
+        return position
+
+    def filter_queryset(self, queryset):
+        queryset = super(TaskSearchMixin, self).filter_queryset(queryset)
+        text = self.get_search_text()
+        if text is None:
+            return queryset
+        if not self.is_ranked() or not can_search(queryset):
+            return search_tasks(queryset, text)
+
+        paginator = self.paginator
+        if paginator is not None and paginator.is_paginating(self.request):
+            # One more than the page, the paginator tells from it whether there is a next page
+            ranks = search_task_ranks(
+                text, queryset, self.get_search_position(paginator), paginator.get_page_size(self.request) + 1
+            )
+        else:
+            ranks = search_task_ranks(text, queryset, limit=settings.TASK_SEARCH_LIMIT + 1)
+            self.search_truncated = len(ranks) > settings.TASK_SEARCH_LIMIT
+            ranks = ranks[:settings.TASK_SEARCH_LIMIT]
+        return rank_tasks(queryset, ranks)
+
+    def get_archived_queryset(self):
+        queryset = super(TaskSearchMixin, self).get_archived_queryset()
+        text = self.get_search_text()
+        if text is None:
+            return queryset
+
+        queryset = search_tasks(queryset, text)
+        if self.is_ranked():
+            queryset = queryset.annotate(search_rank=Value(float('inf'), output_field=FloatField()))
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(TaskSearchMixin, self).finalize_response(request, response, *args, **kwargs)
+        if self.search_truncated:
+            response['X-Search-Truncated'] = 'true'
+        return response
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -24,11 +250,17 @@ class GroupViewSet(viewsets.ModelViewSet):
     serializer_class = GroupSerializer
 
 
-class TaskList(generics.ListCreateAPIView):
+class TaskList(ConditionalGetMixin, TaskSearchMixin, IncludeArchivedMixin, StreamingListMixin, TaskFieldsetMixin,
+               generics.ListCreateAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = (IsAuthenticated,)
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer, CSVRenderer]
+    pagination_class = TaskPagination
     filter_backends = (filters.SearchFilter, django_filters.rest_framework.DjangoFilterBackend)
+    filterset_class = TaskFilter
+    # GETs read from a replica, see task_tracker.routers
+    replica_reads = True
     search_fields = (
         'title',
         'project__name',
@@ -38,33 +270,349 @@ class TaskList(generics.ListCreateAPIView):
         'descriptions__text'
     )
 
+    def get_serializer(self, *args, **kwargs):
+        # A JSON array creates all of its tasks in one transaction
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super(TaskList, self).get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        params_dict = settings.TASK_PARAMS_DICT
-        queryset = Task.objects.all()
-        queue_dict = {}
+        return self.get_task_queryset()
 
-        for param in params_dict:
-            query_param = self.request.query_params.get(param, None)
-            if query_param is not None:
-                queue_dict[params_dict[param]] = query_param
+    def get_version(self):
+        # Not limited to the filtered tasks, a task may have left the filter
+        return get_tasks_version()
 
-        queryset = queryset.filter(**queue_dict)
-        return queryset
+    def get_last_modified(self, version):
+        return get_tasks_last_modified(version)
+
+
+class TaskExport(TaskSearchMixin, IncludeArchivedMixin, StreamingListMixin, TaskFieldsetMixin, generics.ListAPIView):
+    """
+    All tasks matching the TaskList filters, streamed as NDJSON (default),
+    CSV or a JSON array: `?format=ndjson|csv|json`. `?include_archived=1`
+    adds the archived tasks.
+    """
+    serializer_class = TaskSerializer
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (NDJSONRenderer, CSVRenderer, StreamingJSONRenderer)
+    filterset_class = TaskFilter
+
+    def get_queryset(self):
+        return self.get_task_queryset()
+
+    def list(self, request, *args, **kwargs):
+        response = super(TaskExport, self).list(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['Content-Disposition'] = 'attachment; filename="tasks.{}"'.format(
+                request.accepted_renderer.format
+            )
+        return response
+
+
+class TaskChangeList(ConditionalGetMixin, TaskFieldsetMixin, generics.ListAPIView):
+    """
+    Tasks created or changed and ids of tasks deleted after the change
+    sequence number `since`, in the order of their latest change. The
+    response `cursor` is the `since` of the next call, `more` tells whether
+    there are further changes already.
+    """
+    serializer_class = TaskSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = None
+
+    def get_since(self):
+        try:
+            since = int(self.request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            raise ValidationError({'since': ['A valid cursor is required.']})
+        return since
+
+    def get_version(self):
+        return get_tasks_version()
+
+    def get_last_modified(self, version):
+        return get_tasks_last_modified(version)
+
+    def list(self, request, *args, **kwargs):
+        since = self.get_since()
+        changes, more = get_changes(since, TaskPagination().get_page_size(request))
 
+        changed_ids = [task_id for _, task_id, deleted in changes if not deleted]
+        tasks = self.get_task_queryset().in_bulk(changed_ids)
+        # A task deleted since reading the changes is left out, its deletion comes next time
+        changed = [tasks[task_id] for task_id in changed_ids if task_id in tasks]
 
-class TaskDetail(generics.RetrieveUpdateDestroyAPIView):
+        return Response(OrderedDict([
+            ('cursor', changes[-1][0] if changes else since),
+            ('more', more),
+            ('tasks', self.get_serializer(changed, many=True).data),
+            ('deleted', [task_id for _, task_id, deleted in changes if deleted]),
+        ]))
+
+
+class TaskDetail(ConditionalGetMixin, TaskFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    A task, live or archived. Archived tasks are read only.
+    """
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = (IsAuthenticated,)
+    # GETs read from a replica, see task_tracker.routers
+    replica_reads = True
+
+    def get_queryset(self):
+        return self.get_task_queryset()
+
+    def get_object(self):
+        try:
+            return super(TaskDetail, self).get_object()
+        except Http404:
+            if self.request.method not in SAFE_METHODS:
+                raise
+        task = get_object_or_404(self.get_task_queryset(archived=True), pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, task)
+        return task
+
+    def get_version(self):
+        updated = Task.objects.filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+        if updated is None:
+            updated = ArchivedTask.objects.filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+        return updated
+
+    def get_last_modified(self, version):
+        return version
+
+    def perform_destroy(self, instance):
+        publish_on_commit([task_event('task.deleted', instance)])
+        super(TaskDetail, self).perform_destroy(instance)
 
 
-class CommentList(generics.ListCreateAPIView):
-    queryset = Comment.objects.all()
+class TaskBulkUpdate(generics.GenericAPIView):
+    """
+    Change status and/or assignee of the tasks selected by ids or by the
+    TaskList filters with a single UPDATE.
+    """
+    serializer_class = TaskBulkUpdateSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def patch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+
+class TaskStats(generics.GenericAPIView):
+    """
+    Number of tasks, in total and per group of the `group_by` fields (comma
+    separated: project, status, assignee), for the tasks matching the
+    project, status and assignee filters of the task list. Read from the
+    task counters, the cost depends on the number of groups only.
+    """
+    queryset = TaskCounter.objects.all()
+    permission_classes = (IsAuthenticated,)
+    filter_backends = (django_filters.rest_framework.DjangoFilterBackend,)
+    filterset_class = TaskCounterFilter
+    pagination_class = None
+    # GETs read from a replica, see task_tracker.routers
+    replica_reads = True
+
+    def get_group_by(self):
+        value = self.request.query_params.get('group_by', '')
+        group_by = [field for field in value.split(',') if field]
+        unknown = [field for field in group_by if field not in GROUP_FIELDS]
+        if unknown or len(set(group_by)) != len(group_by):
+            raise ValidationError({'group_by': [
+                'Comma separated distinct fields among {}'.format(', '.join(GROUP_FIELDS))
+            ]})
+        return group_by
+
+    def get(self, request, *args, **kwargs):
+        group_by = self.get_group_by()
+        total, groups = get_stats(group_by, self.filter_queryset(self.get_queryset()))
+        data = OrderedDict([('total', total)])
+        if group_by:
+            data['groups'] = groups
+        return Response(data)
+
+
+class CommentList(ConditionalGetMixin, StreamingListMixin, generics.ListCreateAPIView):
+    queryset = Comment.objects.select_related('author')
+    serializer_class = CommentSerializer
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer, CSVRenderer]
+    pagination_class = CommentPagination
+    # GETs read from a replica, see task_tracker.routers
+    replica_reads = True
+
+    def get_serializer(self, *args, **kwargs):
+        # A JSON array creates all of its comments, for any tasks, in one transaction
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super(CommentList, self).get_serializer(*args, **kwargs)
+
+    def get_version(self):
+        # Comment writes bump the updated field of their task
+        return get_tasks_version()
+
+    def get_last_modified(self, version):
+        return get_tasks_last_modified(version)
+
+
+class TaskCommentList(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Comments of one task, live or archived, newest first, keyset paginated
+    on (created, id).
+    """
     serializer_class = CommentSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = TaskCommentPagination
+    # GETs read from a replica, see task_tracker.routers
+    replica_reads = True
+    # Set by get_version when the task is archived
+    archived = False
+
+    def get_queryset(self):
+        model = ArchivedComment if self.archived else Comment
+        return model.objects.filter(task_id=self.kwargs['pk']).select_related('author')
+
+    def get_version(self):
+        # Also the existence check of the task
+        updated = Task.objects.filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+        if updated is None:
+            updated = ArchivedTask.objects.filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+            self.archived = True
+        if updated is None:
+            raise Http404
+        return updated
+
+    def get_last_modified(self, version):
+        return version
 
 
 class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('author')
     serializer_class = CommentSerializer
     permission_classes = (IsAuthenticated,)
+    # GETs read from a replica, see task_tracker.routers
+    replica_reads = True
+
+    def perform_destroy(self, instance):
+        # Built before the delete clears the pk
+        event = comment_event('comment.deleted', instance, instance.task)
+        super(CommentDetail, self).perform_destroy(instance)
+        touch_tasks([instance.task_id])
+        publish_on_commit([event])
+
+
+class SavedViewOwnerMixin(object):
+    """
+    Saved views are private: a user only sees, changes and reads the tasks
+    of their own views, those of others are not found.
+    """
+    def get_saved_views(self):
+        return SavedView.objects.filter(owner=self.request.user)
+
+
+class SavedViewList(SavedViewOwnerMixin, generics.ListCreateAPIView):
+    serializer_class = SavedViewSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.get_saved_views().select_related('owner')
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+
+class SavedViewDetail(SavedViewOwnerMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = SavedViewSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.get_saved_views().select_related('owner')
+
+
+class SavedViewTaskList(SavedViewOwnerMixin, ConditionalGetMixin, TaskFieldsetMixin, generics.ListAPIView):
+    """
+    Tasks of a saved view, read from its materialized ids instead of
+    re-running the filters.
+    """
+    serializer_class = TaskSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = TaskPagination
+
+    def get_queryset(self):
+        task_ids = SavedViewTask.objects.filter(
+            view__in=self.get_saved_views().filter(pk=self.kwargs['pk'])
+        ).values('task_id')
+        return self.get_task_queryset().filter(pk__in=task_ids)
+
+    def get_version(self):
+        # Also the existence check of the view
+        updated = self.get_saved_views().filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+        if updated is None:
+            raise Http404
+        return (updated,) + get_tasks_version()
+
+    def get_last_modified(self, version):
+        return max(timestamp for timestamp in (version[0], version[-1]) if timestamp is not None)
+
+
+class EventStream(generics.GenericAPIView):
+    """
+    Server-Sent Events of task and comment changes as they are committed:
+    task.created, task.updated, task.deleted, comment.created,
+    comment.updated and comment.deleted. `project`, `status` and `assignee`
+    (names, comma separated) restrict the stream to the matching tasks.
+    An `overflow` event ends the stream of a client not keeping up, it
+    should catch up with /api/task/changes/ and reconnect.
+    """
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (EventStreamRenderer,)
+    filter_models = dict(zip(EVENT_FILTER_FIELDS, (Project, Status, User)))
+
+    def get_filters(self):
+        filters = {}
+        errors = {}
+        for field in EVENT_FILTER_FIELDS:
+            value = self.request.query_params.get(field)
+            if not value:
+                continue
+            names = value.split(',')
+            found = LOOKUP_CACHES[self.filter_models[field]].get_many(names)
+            unknown = [name for name in names if name not in found]
+            if unknown:
+                errors[field] = ['Unknown {}: {}'.format(field, ', '.join(unknown))]
+            filters[field] = {obj.pk for obj in found.values()}
+        if errors:
+            raise ValidationError(errors)
+        return filters
+
+    def get(self, request, *args, **kwargs):
+        filters = self.get_filters()
+        loop = request.META.get(EVENT_LOOP_KEY)
+        if loop is None:
+            response = StreamingHttpResponse(
+                stream_events(broker.subscribe(filters)), content_type='text/event-stream'
+            )
+        else:
+            # Under ASGI the events are sent by the event loop, no thread waits for them
+            response = StreamingHttpResponse((), content_type='text/event-stream')
+            response.async_streaming_content = stream_events_async(
+                broker.subscribe(filters, AsyncSubscription, loop=loop)
+            )
+        response['Cache-Control'] = 'no-cache'
+        # Do not let nginx buffer the events
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def metrics(request):
+    """
+    Request metrics of all the workers in the Prometheus text format, for
+    the scraper: keep it reachable from the internal network only.
+    """
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
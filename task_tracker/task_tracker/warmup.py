@@ -0,0 +1,39 @@
+import logging
+import time
+
+from django.db import connections
+from django.urls import get_resolver, reverse
+from task_tracker.lookups import LOOKUP_CACHES
+from task_tracker.serializers import CommentSerializer, SavedViewSerializer, TaskBulkUpdateSerializer, \
+    TaskSerializer
+
+logger = logging.getLogger(__name__)
+
+# Serializers built once for the metadata caches of their models (fields,
+# relations, reverse relations), filled on the first request otherwise. The
+# serializer fields themselves are built again for every request.
+WARM_SERIALIZERS = (TaskSerializer, CommentSerializer, SavedViewSerializer, TaskBulkUpdateSerializer)
+
+
+def warm_up():
+    """
+    Do the lazy work of the first requests that is kept for the life of the
+    process up front: populate the URL resolver, fill the metadata caches of
+    the models the serializers read and the status, project and user lookup
+    caches. Called by the server before it forks the workers, which then
+    share the result; the database connections are closed afterwards, a
+    connection must not be shared with the children.
+    """
+    started = time.monotonic()
+
+    resolver = get_resolver()
+    resolver.resolve(reverse('tasks'))
+
+    for serializer_class in WARM_SERIALIZERS:
+        serializer_class().fields
+
+    for cache in LOOKUP_CACHES.values():
+        cache.preload()
+
+    connections.close_all()
+    logger.info('Warmed up in %.3fs', time.monotonic() - started)